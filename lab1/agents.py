@@ -12,7 +12,15 @@
 # @author Régis Clouard
 
 import copy
+import heapq
+import itertools
+import os
+import shutil
+import tempfile
 import utils
+from collections import deque
+from sokobanframe import SokobanState
+from utils import PriorityQueue, BucketQueue, NodeStore, SearchStatistics, TimeoutFunctionException, expand_actions
 
 class Agent:
     """
@@ -20,11 +28,41 @@ class Agent:
     It is based on the Strategy Design Pattern (abstract method is search()).
 
     YOU DO NOT NEED TO CHANGE ANYTHING IN THIS CLASS, EVER.
+
+    solve() runs search() and keeps the statistics of that search in
+    self.statistics. The searches update them through expand(),
+    heuristic() and the counters of SearchStatistics.
     """
+    def __init__( self ):
+        self.statistics = SearchStatistics()
+
     def search( self ):
         """ This is the method to implement for each specific searcher."""
         raise Exception("Invalid Agent class, search() not implemented")
 
+    def solve( self, initial_state, statistics = None ):
+        """ Runs search() from the initial state and returns the path.
+        The statistics are recorded in the given SearchStatistics object,
+        or in a new one, which is then self.statistics. """
+        self.statistics = statistics if statistics is not None else SearchStatistics()
+        self.statistics.start()
+        try:
+            return self.search(initial_state)
+        finally:
+            self.statistics.stop()
+
+    def expand( self, state ):
+        """ Returns the successors of the state and counts them."""
+        successors = state.get_successor_states()
+        self.statistics.expanded += 1
+        self.statistics.generated += len(successors)
+        return successors
+
+    def heuristic( self, state ):
+        """ Returns the heuristic value of the state and counts the call."""
+        self.statistics.heuristic_calls += 1
+        return state.heuristic()
+
  #  ______                               _                  __ 
  # |  ____|                             (_)                /_ |
  # | |__    __  __   ___   _ __    ___   _   ___    ___     | |
@@ -41,28 +79,31 @@ class DFS( Agent ):
         { Direction.left, Direction.right, Direction.up, Direction.down }
 
         """
-        open_list = [[ (initial_state, None) ]] # A state is a pair (board, direction)
+        nodes = NodeStore() # A node is a state with its parent and direction
+        open_list = [ nodes.add(initial_state) ] # A stack of nodes
         closed_list = set([initial_state]) # keep already explored positions
 
         while open_list:
-            # Get the path at the top of the stack (pop(0) returns the first item of the list)
-            current_path = open_list.pop(0)
-            # Get the last place of that path
-            current_state, current_direction = current_path[-1]
+            # Get the node at the top of the stack
+            current_node = open_list.pop()
+            current_state = nodes.states[current_node]
             # Check if we have reached the goal
             if current_state.is_goal_state():
-                # remove the start point and return only the directions.
-                return (list (map(lambda x : x[1], current_path[1:])))
+                # rebuild the directions from the start point.
+                return nodes.path(current_node)
             else:
                 # Check where we can go from here
-                next_steps = current_state.get_successor_states()
-                # Add the new paths (one step longer) to the stack
+                next_steps = self.expand(current_state)
+                # Add the new nodes (one step longer) to the stack
                 for state, direction, weight in next_steps:
                     # do not add already explored states
                     if state not in closed_list:
-                        # add at the end of the list
+                        # add at the top of the stack
                         closed_list.add(state)
-                        open_list.insert(0, (current_path + [ (state, direction) ]) )
+                        open_list.append(nodes.add(state, current_node, direction, nodes.costs[current_node] + weight))
+                    else:
+                        self.statistics.duplicates += 1
+                self.statistics.update(len(open_list), len(closed_list))
         return []
 
 class BFS( Agent ):
@@ -78,28 +119,31 @@ class BFS( Agent ):
         - state.get_successor_states(): Returns all states reachable from the state as a list of triplets (state, direction, cost).
         """
 
-        open_list = [[ (initial_state, None) ]]
+        nodes = NodeStore()
+        open_list = deque([ nodes.add(initial_state) ])
         closed_list = set([initial_state])
 
         while open_list:
-            # Get the path at the top of the Queue (pop(0) returns the first item of the list)
-            current_path = open_list.pop(0)
-            # Get the last place of that path
-            current_state, current_direction = current_path[-1]
+            # Get the node at the front of the Queue
+            current_node = open_list.popleft()
+            current_state = nodes.states[current_node]
             # Check if we have reached the goal
             if current_state.is_goal_state():
-                # remove the start point and return only the directions.
-                return (list (map(lambda x : x[1], current_path[1:])))
+                # rebuild the directions from the start point.
+                return nodes.path(current_node)
             else:
                 # Check where we can go from here
-                next_steps = current_state.get_successor_states()
-                # Add the new paths (one step longer) to the stack
+                next_steps = self.expand(current_state)
+                # Add the new nodes (one step longer) to the queue
                 for state, direction, weight in next_steps:
                     # do not add already explored states
                     if state not in closed_list:
-                        # add at the end of the list
+                        # add at the end of the queue
                         closed_list.add(state)
-                        open_list.append((current_path + [ (state, direction) ]) )
+                        open_list.append(nodes.add(state, current_node, direction, nodes.costs[current_node] + weight))
+                    else:
+                        self.statistics.duplicates += 1
+                self.statistics.update(len(open_list), len(closed_list))
         return []
 
 
@@ -116,31 +160,41 @@ class UCS( Agent ):
 
         It returns the path as a list of directions among
         { Direction.left, Direction.right, Direction.up, Direction.down }
+
+        In push mode the successors have different costs, so a cheaper
+        path to a state may be found after the first one: the best cost
+        of each state is kept, a state is queued again when it improves,
+        and the entries of the queue that are no longer the best are
+        skipped.
         """
 
         # use a priority queue with the minimum queue.
-        from utils import PriorityQueue
-        open_list = PriorityQueue()
-        open_list.push([(initial_state, None)], 0) # a state is a pair (boad, direction)
-        closed_list = set([initial_state]) # keep already explored positions
+        nodes = NodeStore()
+        open_list = BucketQueue()
+        open_list.push(nodes.add(initial_state), 0)
+        best_costs = {initial_state: 0} # cost of the cheapest path found to each state
 
         while not open_list.isEmpty():
-            # Get the path at the top of the queue
-            current_path, cost = open_list.pop()
-            # Get the last place of that path
-            current_state, current_direction = current_path[-1]
+            # Get the node at the top of the queue
+            current_node, cost = open_list.pop()
+            current_state = nodes.states[current_node]
+            if cost > best_costs[current_state]:
+                continue # a cheaper path to the state was found since
             # Check if we have reached the goal
             if current_state.is_goal_state():
-                return (list (map(lambda x : x[1], current_path[1:])))
+                return nodes.path(current_node)
             else:
                 # Check were we can go from here
-                next_steps = current_state.get_successor_states()
-                # Add the new paths (one step longer) to the queue
+                next_steps = self.expand(current_state)
+                # Add the new nodes to the queue
                 for state, direction, weight in next_steps:
                     # Avoid loop!
-                    if state not in closed_list:
-                        closed_list.add(state)
-                        open_list.push((current_path + [ (state, direction) ]), cost + weight)
+                    if cost + weight < best_costs.get(state, float("inf")):
+                        best_costs[state] = cost + weight
+                        open_list.push(nodes.add(state, current_node, direction, cost + weight), cost + weight)
+                    else:
+                        self.statistics.duplicates += 1
+                self.statistics.update(len(open_list), len(best_costs))
         return []
 
 class GBFS( Agent ):
@@ -157,31 +211,64 @@ class GBFS( Agent ):
         - state.heuristic(): Returns the heuristic value for the specified state.
         """
 
-        from utils import PriorityQueue
-        open_list = PriorityQueue()
-        open_list.push([(initial_state, None)], 0) # a state is a pair (boad, direction)
+        nodes = NodeStore()
+        open_list = BucketQueue()
+        open_list.push(nodes.add(initial_state), 0)
         closed_list = set([initial_state]) # keep already explored positions
 
         while not open_list.isEmpty():
-            # Get the path at the top of the queue
-            current_path, cost = open_list.pop()
-            # Get the last place of that path
-            current_state, current_direction = current_path[-1]
+            # Get the node at the top of the queue
+            current_node, priority = open_list.pop()
+            current_state = nodes.states[current_node]
             # Check if we have reached the goal
             if current_state.is_goal_state():
-                return (list (map(lambda x : x[1], current_path[1:])))
+                return nodes.path(current_node)
             else:
                 # Check were we can go from here
-
-                next_steps = current_state.get_successor_states()
-                # Add the new paths (one step longer) to the queue
+                next_steps = self.expand(current_state)
+                # Add the new nodes (one step longer) to the queue
                 for state, direction, weight in next_steps:
                     # Avoid loop!
-                    
                     if state not in closed_list:
-                        
                         closed_list.add(state)
-                        open_list.push((current_path + [ (state, direction) ]), state.heuristic())
+                        cost = nodes.costs[current_node] + weight
+                        # the deepest node first among those of same heuristic
+                        open_list.push(nodes.add(state, current_node, direction, cost), self.heuristic(state), -cost)
+                    else:
+                        self.statistics.duplicates += 1
+                self.statistics.update(len(open_list), len(closed_list))
+        return []
+
+class DGBFS( GBFS ):
+
+    def search( self, initial_state ):
+        """ Greedy Best First Search with deferred heuristic evaluation.
+
+        The successors are queued with the heuristic of their parent, and
+        the heuristic of a node is only computed when it is expanded, for
+        its own successors. Fewer heuristic values are computed, at the
+        cost of a less informed order among siblings.
+        """
+        nodes = NodeStore()
+        open_list = BucketQueue()
+        open_list.push(nodes.add(initial_state), 0)
+        closed_list = set([initial_state]) # keep already explored positions
+
+        while not open_list.isEmpty():
+            current_node, priority = open_list.pop()
+            current_state = nodes.states[current_node]
+            if current_state.is_goal_state():
+                return nodes.path(current_node)
+            # the successors wait with the heuristic of their parent
+            h = self.heuristic(current_state)
+            for state, direction, weight in self.expand(current_state):
+                if state not in closed_list:
+                    closed_list.add(state)
+                    cost = nodes.costs[current_node] + weight
+                    open_list.push(nodes.add(state, current_node, direction, cost), h, -cost)
+                else:
+                    self.statistics.duplicates += 1
+            self.statistics.update(len(open_list), len(closed_list))
         return []
 
  #  ______                               _                  ____  
@@ -192,6 +279,8 @@ class GBFS( Agent ):
  # |______| /_/\_\  \___| |_|     \___| |_| |___/  \___|   |____/ 
 
 class ASS( Agent ):
+    WEIGHT = 1 # weight of the heuristic in the priority
+
     def search( self, initial_state ):
         """ A Star Search.
 
@@ -203,35 +292,314 @@ class ASS( Agent ):
         - state.get_successor_states(): Returns all states reachable from the specified state as a list of triplets (state, direction, cost)
         - state.heuristic(): Returns the heuristic value for the specified state.
 
+        As in UCS, the best cost of each state is kept and a state is
+        queued again (and expanded again) when a cheaper path to it is
+        found, since the successors of push mode have different costs.
         """
-        from utils import PriorityQueue
-        open_list = PriorityQueue()
-        open_list.push([(initial_state, None)], 0) # a state is a pair (boad, direction)
-        closed_list = set([initial_state]) # keep already explored positions
+        nodes = NodeStore()
+        open_list = BucketQueue()
+        open_list.push(nodes.add(initial_state), 0)
+        best_costs = {initial_state: 0} # cost of the cheapest path found to each state
 
         while not open_list.isEmpty():
-            # Get the path at the top of the queue
-            current_path, priority = open_list.pop()
-            # Get the last place of that path
-            current_state, current_direction = current_path[-1]
+            # Get the node at the top of the queue
+            current_node, priority = open_list.pop()
+            current_state = nodes.states[current_node]
+            # the path cost is kept in the node, no need to recompute the heuristic
+            cost = nodes.costs[current_node]
+            if cost > best_costs[current_state]:
+                continue # a cheaper path to the state was found since
             # Check if we have reached the goal
-            cost = priority - current_state.heuristic()
             if current_state.is_goal_state():
-                return (list (map(lambda x : x[1], current_path[1:])))
+                return nodes.path(current_node)
             else:
                 # Check were we can go from here
-
-                next_steps = current_state.get_successor_states()
-                # Add the new paths (one step longer) to the queue
+                next_steps = self.expand(current_state)
+                # Add the new nodes to the queue
                 for state, direction, weight in next_steps:
                     # Avoid loop!
-                    
-                    if state not in closed_list:
-                        
-                        closed_list.add(state)
-                        open_list.push((current_path + [ (state, direction) ]), state.heuristic() + cost + weight )
+                    if cost + weight < best_costs.get(state, float("inf")):
+                        best_costs[state] = cost + weight
+                        h = self.heuristic(state)
+                        # the node closest to a goal first among those of same f
+                        open_list.push(nodes.add(state, current_node, direction, cost + weight), self.WEIGHT * h + cost + weight, h)
+                    else:
+                        self.statistics.duplicates += 1
+                self.statistics.update(len(open_list), len(best_costs))
         return []
         
+class WASS( ASS ):
+    """ Weighted A* Search: A* with the heuristic multiplied by WEIGHT.
+    The solutions found can be up to WEIGHT times longer than the
+    optimal ones, but far fewer nodes are expanded. """
+    WEIGHT = 2
+
+class DASS( ASS ):
+
+    def search( self, initial_state ):
+        """ A Star Search with deferred heuristic evaluation.
+
+        A successor is queued with the heuristic of its parent minus the
+        cost of the move, which is a lower bound of its own heuristic when
+        the heuristic is consistent. Its own heuristic is only computed
+        when it is popped: if its f is then larger than its priority, it
+        goes back in the queue with its f, otherwise it is expanded. As in
+        ASS, the best cost of each state is kept and a state is queued
+        again when it improves. The solutions are optimal when the
+        heuristic is consistent, as heuristic4() is, with fewer heuristic
+        values computed. heuristic5() is only admissible: with a pattern
+        database, the solutions may be longer than the optimal ones.
+        """
+        nodes = NodeStore()
+        open_list = BucketQueue()
+        open_list.push(nodes.add(initial_state), 0)
+        best_costs = {initial_state: 0} # cost of the cheapest path found to each state
+        heuristics = {} # node -> heuristic, once computed
+
+        while not open_list.isEmpty():
+            current_node, priority = open_list.pop()
+            current_state = nodes.states[current_node]
+            cost = nodes.costs[current_node]
+            if cost > best_costs[current_state]:
+                continue # a cheaper path to the state was found since
+            if current_state.is_goal_state():
+                return nodes.path(current_node)
+            if current_node not in heuristics:
+                h = heuristics[current_node] = self.heuristic(current_state)
+                if self.WEIGHT * h + cost > priority:
+                    open_list.push(current_node, self.WEIGHT * h + cost, h)
+                    continue
+            h = heuristics.pop(current_node)
+            for state, direction, weight in self.expand(current_state):
+                if cost + weight < best_costs.get(state, float("inf")):
+                    best_costs[state] = cost + weight
+                    lower_bound = max(h - weight, 0)
+                    open_list.push(nodes.add(state, current_node, direction, cost + weight), self.WEIGHT * lower_bound + cost + weight, lower_bound)
+                else:
+                    self.statistics.duplicates += 1
+            self.statistics.update(len(open_list), len(best_costs))
+        return []
+
+class SMASS( Agent ):
+    MAX_NODES = 200000 # memory budget, in nodes
+
+    def search( self, initial_state ):
+        """ Simplified Memory-bounded A* Search.
+
+        A* on the search tree that keeps at most MAX_NODES nodes in memory.
+        When the budget is exceeded, the worst leaves (highest f, then
+        shallowest) are forgotten and their f is backed up into their
+        parent, which stays in the frontier with the smallest f of its
+        forgotten children until they are generated again. The children
+        of the node just expanded are forgotten last; when none of them
+        fits, the node gets an infinite f: its subtree is too deep for the
+        budget. The solution is optimal when the optimal path, with the
+        siblings of its nodes, fits in the budget.
+
+        A state is not generated again while a node reaching it by a path
+        at least as short is in memory.
+        """
+        states = {} # node -> state
+        parents = {} # node -> parent node
+        actions = {} # node -> action from the parent
+        costs = {} # node -> g
+        depths = {} # node -> depth
+        bounds = {} # node -> f when generated
+        children = {} # node -> set of the children in memory
+        forgotten = {} # node -> {state: f} of the forgotten children
+        table = {} # state -> node in memory with the smallest g
+        open_f = {} # frontier node -> f
+        best = [] # heap of (f, -depth, node)
+        worst = [] # heap of (-f, depth, node)
+        numbers = itertools.count()
+
+        def add( state, parent, action, cost, f ):
+            node = next(numbers)
+            states[node], parents[node], actions[node] = state, parent, action
+            costs[node] = cost
+            depths[node] = 0 if parent is None else depths[parent] + 1
+            bounds[node] = f
+            children[node], forgotten[node] = set(), {}
+            if parent is not None:
+                children[parent].add(node)
+            if state not in table or costs[table[state]] > cost:
+                table[state] = node
+            push(node, f)
+            return node
+
+        def push( node, f ):
+            open_f[node] = f
+            heapq.heappush(best, (f, -depths[node], node))
+            heapq.heappush(worst, (-f, depths[node], node))
+
+        def forget( node, f ):
+            """ Removes the leaf from memory and backs its f up to its parent."""
+            parent = parents[node]
+            state = states[node]
+            open_f.pop(node, None)
+            for store in (states, parents, actions, costs, depths, bounds, children, forgotten):
+                del store[node]
+            if table.get(state) == node:
+                del table[state]
+            children[parent].discard(node)
+            forgotten[parent][state] = min(f, forgotten[parent].get(state, f))
+            push(parent, min(forgotten[parent].values()))
+
+        root = add(initial_state, None, None, 0, self.heuristic(initial_state))
+
+        while best:
+            f, depth, current_node = heapq.heappop(best)
+            if open_f.get(current_node) != f:
+                continue # stale entry
+            if f == float("inf"):
+                return []
+            current_state = states[current_node]
+            if current_state.is_goal_state():
+                path = []
+                while parents[current_node] is not None:
+                    path.append(actions[current_node])
+                    current_node = parents[current_node]
+                path.reverse()
+                return expand_actions(path)
+            del open_f[current_node]
+
+            # generate the children, or only the forgotten ones again
+            cost = costs[current_node]
+            expanded = bool(forgotten[current_node]) or bool(children[current_node])
+            backed_up = forgotten[current_node]
+            forgotten[current_node] = {}
+            for state, direction, weight in self.expand(current_state):
+                if state in backed_up:
+                    add(state, current_node, direction, cost + weight, backed_up[state])
+                elif expanded:
+                    continue # still in memory
+                elif state in table and costs[table[state]] <= cost + weight:
+                    # a path to this state at least as short is in memory
+                    self.statistics.duplicates += 1
+                else:
+                    # pathmax keeps f monotonic along the path
+                    add(state, current_node, direction, cost + weight, max(bounds[current_node], cost + weight + self.heuristic(state)))
+
+            # the children of the current node are forgotten last
+            kept = []
+            while len(states) > self.MAX_NODES and worst:
+                f, depth, node = heapq.heappop(worst)
+                if open_f.get(node) != -f or children[node]:
+                    continue # stale entry, or not a leaf
+                if node == root or parents[node] == current_node:
+                    kept.append((f, depth, node))
+                else:
+                    forget(node, -f)
+            kept.sort()
+            for f, depth, node in kept:
+                if node not in states:
+                    continue # already forgotten
+                if len(states) > self.MAX_NODES and node != root:
+                    forget(node, -f)
+                else:
+                    heapq.heappush(worst, (f, depth, node))
+            if not children[current_node]:
+                # a dead end, or none of its children fits in memory
+                if current_node == root:
+                    return []
+                forget(current_node, float("inf"))
+            self.statistics.update(len(open_f), len(states))
+        return []
+
+class ARASS( Agent ):
+    WEIGHT = 3 # weight of the heuristic in the first search
+    WEIGHT_STEP = 0.5 # decrease of the weight after each search
+
+    def search( self, initial_state ):
+        """ Anytime Repairing A* Search.
+
+        A weighted A* that quickly finds a first solution with a high
+        weight, then searches again with a smaller weight, down to 1, each
+        time keeping the g values and the frontier of the previous search:
+        the states whose g has decreased since they were expanded are put
+        back in the frontier. Each solution found is at most
+        statistics.suboptimality times longer than the optimal one. When
+        the time is out (TimeoutFunctionException), the best solution found
+        so far is returned.
+        """
+        if initial_state.is_goal_state():
+            return []
+        self.weight = self.WEIGHT
+        self.nodes = NodeStore()
+        root = self.nodes.add(initial_state)
+        self.best = {initial_state: root} # state -> node of the shortest path found
+        self.heuristics = {initial_state: self.heuristic(initial_state)}
+        self.open_list = PriorityQueue()
+        self.open_list.push(root, self.priority(root))
+        self.inconsistent = set() # states improved after their expansion
+        self.goal_node = None
+        self.goal_cost = float("inf")
+        path = []
+        try:
+            while True:
+                self.improve_path()
+                if self.goal_node is None:
+                    return []
+                path = self.nodes.path(self.goal_node)
+                self.statistics.suboptimality = min(self.weight, self.goal_cost / self.lower_bound())
+                if self.statistics.suboptimality <= 1:
+                    return path
+                self.weight = max(1, self.weight - self.WEIGHT_STEP)
+                # the frontier and the inconsistent states, with the new weight
+                frontier = set(self.nodes.states[node] for node in self.open_list.items())
+                self.open_list = PriorityQueue()
+                for state in frontier | self.inconsistent:
+                    node = self.best[state]
+                    self.open_list.push(node, self.priority(node))
+                self.inconsistent = set()
+        except TimeoutFunctionException:
+            if path:
+                return path
+            raise
+
+    def priority( self, node ):
+        return self.nodes.costs[node] + self.weight * self.heuristics[self.nodes.states[node]]
+
+    def lower_bound( self ):
+        """ Returns the smallest g + h in the frontier and the inconsistent
+        states: no solution is shorter. """
+        states = set(self.nodes.states[node] for node in self.open_list.items()) | self.inconsistent
+        costs = [self.nodes.costs[self.best[state]] + self.heuristics[state] for state in states]
+        return max(1, min(costs + [self.goal_cost]))
+
+    def improve_path( self ):
+        """ Weighted A* until no node of the frontier can lead to a better
+        solution than the best one found. """
+        closed_list = set()
+        while not self.open_list.isEmpty():
+            current_node, priority = self.open_list.pop()
+            if priority >= self.goal_cost:
+                self.open_list.push(current_node, priority)
+                return
+            current_state = self.nodes.states[current_node]
+            if self.best[current_state] != current_node or current_state in closed_list:
+                continue # stale entry
+            closed_list.add(current_state)
+            cost = self.nodes.costs[current_node]
+            for state, direction, weight in self.expand(current_state):
+                if state in self.best and self.nodes.costs[self.best[state]] <= cost + weight:
+                    self.statistics.duplicates += 1
+                    continue
+                node = self.nodes.add(state, current_node, direction, cost + weight)
+                self.best[state] = node
+                if state.is_goal_state():
+                    # another goal state (the player elsewhere) may cost more
+                    if cost + weight < self.goal_cost:
+                        self.goal_node = node
+                        self.goal_cost = cost + weight
+                elif state in closed_list:
+                    self.inconsistent.add(state)
+                else:
+                    if state not in self.heuristics:
+                        self.heuristics[state] = self.heuristic(state)
+                    self.open_list.push(node, self.priority(node))
+            self.statistics.update(len(self.open_list), len(self.best))
+
  #  ______                               _                  _  _   
  # |  ____|                             (_)                | || |  
  # | |__    __  __   ___   _ __    ___   _   ___    ___    | || |_ 
@@ -241,37 +609,53 @@ class ASS( Agent ):
 
 class IDS( Agent ):
     MAX_PATH_LENGTH = 500 # Found in literature
+    TABLE_SIZE = 1000000 # Maximum number of states in the transposition table
+
     def search( self, initial_state ):
-       
-        
-       
-       for limit in range(self.MAX_PATH_LENGTH):
-            open_list = [[ (initial_state, None) ]] # A state is a pair (board, direction)
-            closed_list = set([initial_state]) 
-            
-            # keep already explored positions
-
-            
-            while open_list:
-                current_path = open_list.pop(0)
-                current_state, current_direction = current_path[-1]
-                depth = len(current_path) - 1
-                if current_state.is_goal_state():
-                    # remove the start point and return only the directions.
-                    return (list (map(lambda x : x[1], current_path[1:])))
-                
-                
-                if depth < limit :
-                        # Check where we can go from here
-                    next_steps = current_state.get_successor_states()
-                        # Add the new paths (one step longer) to the stack
-                    for state, direction, weight in next_steps:
-                            # do not add already explored states
-                        if state not in closed_list:
-                                # add at the end of the list
-                            closed_list.add(state)
-                            open_list.insert(0, (current_path + [ (state, direction) ]) )
-       return []
+        """ Iterative Deepening Search
+
+        Runs a depth-first search limited to limit steps, for limit = 1, 2, ...
+        Only the current path is stored, as a stack of successor iterators,
+        with a transposition table of the shallowest depth at which each
+        state has been reached during this iteration: a state reached again
+        is only explored when the new path to it is shorter. The search
+        stops when no state has been cut by the limit.
+        """
+        if initial_state.is_goal_state():
+            return []
+        for limit in range(1, self.MAX_PATH_LENGTH + 1):
+            depths = {initial_state: 0} # transposition table
+            path = [] # the actions from the initial state to the top of the stack
+            stack = [iter(self.expand(initial_state))]
+            cut = False
+
+            while stack:
+                step = next(stack[-1], None)
+                if step is None:
+                    # backtrack
+                    stack.pop()
+                    if path:
+                        path.pop()
+                    continue
+                state, direction, weight = step
+                depth = len(stack)
+                if depths.get(state, depth + 1) <= depth:
+                    self.statistics.duplicates += 1
+                    continue
+                if state.is_goal_state():
+                    path.append(direction)
+                    return expand_actions(path)
+                if state in depths or len(depths) < self.TABLE_SIZE:
+                    depths[state] = depth
+                if depth < limit:
+                    path.append(direction)
+                    stack.append(iter(self.expand(state)))
+                    self.statistics.update(len(stack), len(depths))
+                else:
+                    cut = True
+            if not cut:
+                return []
+        return []
     
         
 
@@ -291,29 +675,35 @@ This is the first limit on f-cost for expansion.
 
 Iterative deepening loop:
 
-At each iteration, we do a DFS like your original code, but we skip nodes with f > bound.
+At each iteration, we do a recursive DFS, but we skip nodes with f > bound.
 
-Stack (open_list):
+Path:
 
-Same style as DFS: a list of paths [ (state, direction) ].
-
-Each element also keeps g (cost so far).
+The list of directions from the initial state, and the set of the states
+on the path, both updated when a node is entered (append/add) and left
+(pop/remove).
 
 Compute f:
 
-f = g + current_state.heuristic()
+f = g + h, where h was computed by the parent when it ordered its children.
 
 If f > bound, we don’t expand, but track min_exceed (the smallest f that exceeded the bound).
 
-Expand successors:
+Transposition table:
 
-Like DFS, but only if the successor is not already in the current path.
+For each state, the best g at which it has been expanded and the bound of
+that iteration. A state reached again in the same iteration with a g that
+is not better is not expanded again. The table holds at most TABLE_SIZE
+states, so the memory stays bounded.
 
-Insert at the front (insert(0, …)) to mimic DFS order.
+Expand successors:
+
+Only the successors that are not already on the current path, the most
+promising first (sorted by h).
 
 Update bound:
 
-After finishing the stack, set bound = min_exceed for the next iteration.
+After finishing the search, set bound = min_exceed for the next iteration.
 
 Stop condition:
 
@@ -321,42 +711,389 @@ Goal found → return directions
 
 No nodes exceeded bound → return []
 """
-class IDASS(Agent):
+class IDASS( Agent ):
     MAX_PATH_LENGTH = 500
+    TABLE_SIZE = 1000000 # Maximum number of states in the transposition table
 
-    def search(self, initial_state):
-        bound = initial_state.heuristic()
-        path = [(initial_state, None)]
+    def search( self, initial_state ):
+        self.table = {} # state -> heuristic learned in the previous searches
+        self.on_path = set([initial_state])
+        path = []
+        bound = self.heuristic(initial_state)
 
         while True:
-            t = self._search(path, 0, bound)
+            t = self._search(initial_state, path, 0, bound, bound)
             if t == "FOUND":
-                return [d for _, d in path[1:]]
+                return expand_actions(path)
             if t == float("inf"):
                 return []  # no solution
             bound = t
 
-    def _search(self, path, g, bound):
-        current_state, _ = path[-1]
-        f = g + current_state.heuristic()
+    def _search( self, current_state, path, g, h, bound ):
+        """ Searches from the state and returns "FOUND" or the smallest f
+        over the bound below it. That f minus g is a better heuristic of
+        the state, kept in the table: the state is cut as soon as g plus
+        its learned heuristic is over the bound, in this iteration (it was
+        already searched) and in the next ones. """
+        learned = self.table.get(current_state)
+        if learned is not None and learned > h:
+            h = learned
+            self.statistics.duplicates += 1
+        f = g + h
 
         if f > bound:
             return f
         if current_state.is_goal_state():
             return "FOUND"
+        self.statistics.update(len(path) + 1, len(self.table))
+
+        successors = []
+        for state, direction, cost in self.expand(current_state):
+            if state not in self.on_path:
+                successors.append((self.heuristic(state), state, direction, cost))
+            else:
+                self.statistics.duplicates += 1
+        successors.sort(key = lambda successor: successor[0])
 
         min_exceed = float("inf")
-        path_states = set(s for s, _ in path)
-
-        for state, direction, cost in current_state.get_successor_states():
-            if state not in path_states:
-                path.append((state, direction))
-                t = self._search(path, g + cost, bound)
-                if t == "FOUND":
-                    return "FOUND"
-                if t < min_exceed:
-                    min_exceed = t
-                path.pop()
+        for h, state, direction, cost in successors:
+            path.append(direction)
+            self.on_path.add(state)
+            t = self._search(state, path, g + cost, h, bound)
+            if t == "FOUND":
+                return "FOUND"
+            if t < min_exceed:
+                min_exceed = t
+            path.pop()
+            self.on_path.remove(state)
 
+        if learned is not None or len(self.table) < self.TABLE_SIZE:
+            self.table[current_state] = min_exceed - g
         return min_exceed
 
+class BDS( Agent ):
+
+    def search( self, initial_state ):
+        """ Bidirectional Search.
+
+        Searches forward from the initial state with pushes and backward
+        from the goal states with pulls, one breadth-first layer at a time,
+        always on the side with the smaller frontier. The searches stop when
+        they meet on the same crates with the player in the same region.
+        The path is the forward path followed by the pushes that undo the
+        pulls of the backward path.
+        """
+        forward = NodeStore()
+        forward_list = [ forward.add(initial_state) ]
+        forward_seen = { self.key(initial_state): forward_list[0] }
+        backward = NodeStore()
+        backward_list = []
+        backward_seen = {}
+        for state in initial_state.get_goal_states():
+            node = backward.add(state)
+            key = self.key(state)
+            if key in forward_seen:
+                return self.join(forward, forward_seen[key], backward, node)
+            backward_seen[key] = node
+            backward_list.append(node)
+
+        while forward_list:
+            if not backward_list or len(forward_list) <= len(backward_list):
+                next_list = []
+                for current_node in forward_list:
+                    current_state = forward.states[current_node]
+                    if current_state.is_goal_state():
+                        return forward.path(current_node)
+                    next_steps = current_state.get_push_successor_states()
+                    self.statistics.expanded += 1
+                    self.statistics.generated += len(next_steps)
+                    for state, action, weight in next_steps:
+                        key = self.key(state)
+                        if key not in forward_seen:
+                            node = forward.add(state, current_node, action, forward.costs[current_node] + weight)
+                            if key in backward_seen:
+                                return self.join(forward, node, backward, backward_seen[key])
+                            forward_seen[key] = node
+                            next_list.append(node)
+                        else:
+                            self.statistics.duplicates += 1
+                    self.statistics.update(len(next_list) + len(backward_list), len(forward_seen) + len(backward_seen))
+                forward_list = next_list
+            else:
+                next_list = []
+                for current_node in backward_list:
+                    current_state = backward.states[current_node]
+                    next_steps = current_state.get_pull_successor_states()
+                    self.statistics.expanded += 1
+                    self.statistics.generated += len(next_steps)
+                    for state, action, weight in next_steps:
+                        key = self.key(state)
+                        if key not in backward_seen:
+                            node = backward.add(state, current_node, action, backward.costs[current_node] + weight)
+                            if key in forward_seen:
+                                return self.join(forward, forward_seen[key], backward, node)
+                            backward_seen[key] = node
+                            next_list.append(node)
+                        else:
+                            self.statistics.duplicates += 1
+                    self.statistics.update(len(forward_list) + len(next_list), len(forward_seen) + len(backward_seen))
+                backward_list = next_list
+        return []
+
+    def key( self, state ):
+        """ The crates and the player's region, shared by both searches. """
+        return (state.crates, min(state.reachable_cells()))
+
+    def join( self, forward, forward_node, backward, backward_node ):
+        """ Returns the directions of the forward path to forward_node, then
+        of the pushes that lead from backward_node back to a goal state. """
+        path = forward.path(forward_node)
+        state = forward.states[forward_node]
+        node = backward_node
+        while backward.parents[node] is not None:
+            cell, direction = backward.actions[node]
+            moves = state.walk(state.reachable_cells(), cell) + [direction]
+            for move in moves:
+                state = state.move_player(move, False)
+            path += moves
+            node = backward.parents[node]
+        return path
+
+class BEAM( Agent ):
+    WIDTH = 100 # number of nodes kept at each depth
+    MAX_PATH_LENGTH = 500
+
+    def search( self, initial_state ):
+        """ Beam Search.
+
+        A breadth-first search that keeps, at each depth, only the WIDTH
+        successors with the smallest heuristic. At most WIDTH nodes are
+        expanded per depth, so the memory and the time are bounded by
+        WIDTH * MAX_PATH_LENGTH nodes, but a solution may be missed.
+        """
+        if initial_state.is_goal_state():
+            return []
+        nodes = NodeStore()
+        beam = [nodes.add(initial_state)]
+        closed_list = set([initial_state])
+
+        for depth in range(self.MAX_PATH_LENGTH):
+            candidates = []
+            for current_node in beam:
+                for state, direction, weight in self.expand(nodes.states[current_node]):
+                    if state not in closed_list:
+                        closed_list.add(state)
+                        node = nodes.add(state, current_node, direction, nodes.costs[current_node] + weight)
+                        if state.is_goal_state():
+                            return nodes.path(node)
+                        candidates.append((self.heuristic(state), node))
+                    else:
+                        self.statistics.duplicates += 1
+            beam = [node for h, node in heapq.nsmallest(self.WIDTH, candidates)]
+            self.statistics.update(len(beam), len(closed_list))
+            if not beam:
+                break
+        return []
+
+class LDS( Agent ):
+    MAX_DISCREPANCIES = 30
+    MAX_PATH_LENGTH = 500
+    TABLE_SIZE = 1000000 # Maximum number of states in the transposition table
+
+    def search( self, initial_state ):
+        """ Limited Discrepancy Search.
+
+        A depth-first search that follows the successors in increasing
+        heuristic order. Choosing the successor of rank i (the best one
+        being of rank 0) costs i discrepancies, and the search is run again
+        with 0, 1, 2, ... MAX_DISCREPANCIES allowed discrepancies. Only
+        the path is stored, with a table of the largest number of
+        discrepancies left with which each state has been searched in the
+        current iteration.
+        """
+        if initial_state.is_goal_state():
+            return []
+        for discrepancies in range(self.MAX_DISCREPANCIES + 1):
+            self.table = {}
+            self.on_path = set([initial_state])
+            self.cut = False # True if a successor was skipped for lack of discrepancies
+            path = []
+            if self._search(initial_state, path, discrepancies):
+                return expand_actions(path)
+            if not self.cut:
+                return []
+        return []
+
+    def _search( self, current_state, path, discrepancies ):
+        if len(path) >= self.MAX_PATH_LENGTH:
+            return False
+        searched = self.table.get(current_state)
+        if searched is not None and searched >= discrepancies:
+            self.statistics.duplicates += 1
+            return False
+        if searched is not None or len(self.table) < self.TABLE_SIZE:
+            self.table[current_state] = discrepancies
+        self.statistics.update(len(path) + 1, len(self.table))
+
+        successors = []
+        for state, direction, weight in self.expand(current_state):
+            if state not in self.on_path:
+                successors.append((self.heuristic(state), state, direction))
+            else:
+                self.statistics.duplicates += 1
+        successors.sort(key = lambda successor: successor[0])
+
+        for rank, (h, state, direction) in enumerate(successors):
+            if rank > discrepancies:
+                self.cut = True
+                break
+            path.append(direction)
+            if state.is_goal_state():
+                return True
+            self.on_path.add(state)
+            if self._search(state, path, discrepancies - rank):
+                return True
+            self.on_path.remove(state)
+            path.pop()
+        return False
+
+class EMBFS( Agent ):
+    BUFFER_SIZE = 1000000 # successors sorted in memory before they are written to a file
+    BLOCK_SIZE = 4096 # records read from a file at once
+
+    def search( self, initial_state ):
+        """ External-Memory Breadth-First Search.
+
+        The states of each depth are kept in a file, as fixed-width
+        records sorted and without duplicates (see encode()), instead of
+        a set of nodes in memory. The successors of a layer are sorted by
+        chunks of BUFFER_SIZE records in run files. The runs are then
+        merged with the file of all the states of the previous layers, so
+        that the duplicates are removed in one pass per layer. There is no
+        parent pointer: the path is found backward, by scanning each layer
+        for a parent of the state of the next one (see path()).
+        """
+        board = initial_state.board
+        self.width = 2 + (len(board.walls) + 7) // 8
+        self.directory = tempfile.mkdtemp(prefix = 'embfs')
+        try:
+            layers = [self.file('layer0')]
+            closed_file = self.file('closed')
+            self.write_records(layers[0], [self.encode(initial_state)])
+            self.write_records(closed_file, [self.encode(initial_state)])
+            closed_size = 1
+            while True:
+                runs = []
+                buffer = []
+                for record in self.read_records(layers[-1]):
+                    current_state = self.decode(board, record)
+                    if current_state.is_goal_state():
+                        return self.path(initial_state, layers, current_state)
+                    for state, direction, weight in self.expand(current_state):
+                        buffer.append(self.encode(state))
+                    if len(buffer) >= self.BUFFER_SIZE:
+                        runs.append(self.write_run(buffer, len(runs)))
+                        buffer = []
+                if buffer:
+                    runs.append(self.write_run(buffer, len(runs)))
+                layer = self.file('layer%d' % len(layers))
+                layer_size = self.write_records(layer, self.new_records(runs, closed_file))
+                for run in runs:
+                    os.remove(run)
+                if layer_size == 0:
+                    return []
+                merged_file = self.file('merged')
+                closed_size = self.write_records(merged_file, heapq.merge(self.read_records(closed_file), self.read_records(layer)))
+                os.replace(merged_file, closed_file)
+                layers.append(layer)
+                self.statistics.update(layer_size, closed_size)
+        finally:
+            shutil.rmtree(self.directory)
+
+    def encode( self, state ):
+        """ Returns the record of the state: the cell that identifies the
+        player (see SokobanState.player_key()) on 2 bytes and the bitmask
+        of the crates, in big-endian order so that the records sort as
+        byte strings. """
+        return state.player_key().to_bytes(2, 'big') + state.crates.to_bytes(self.width - 2, 'big')
+
+    def decode( self, board, record ):
+        player = int.from_bytes(record[:2], 'big')
+        crates = int.from_bytes(record[2:], 'big')
+        state = SokobanState(board, player, crates)
+        for cell in state.crate_cells():
+            state.crate_hash ^= board.crate_keys[cell]
+        return state
+
+    def file( self, name ):
+        return os.path.join(self.directory, name)
+
+    def write_records( self, filename, records ):
+        """ Writes the records in the file and returns their number. """
+        size = 0
+        with open(filename, 'wb') as records_file:
+            for record in records:
+                records_file.write(record)
+                size += 1
+        return size
+
+    def read_records( self, filename ):
+        """ Yields the records of the file, reading BLOCK_SIZE of them at once. """
+        with open(filename, 'rb') as records_file:
+            while True:
+                block = records_file.read(self.width * self.BLOCK_SIZE)
+                if not block:
+                    break
+                for start in range(0, len(block), self.width):
+                    yield block[start:start + self.width]
+
+    def write_run( self, buffer, number ):
+        """ Writes the records of the buffer, sorted and without duplicates,
+        in a new run file and returns its name. """
+        records = sorted(set(buffer))
+        self.statistics.duplicates += len(buffer) - len(records)
+        run = self.file('run%d' % number)
+        self.write_records(run, records)
+        return run
+
+    def new_records( self, runs, closed_file ):
+        """ Yields the records of the runs, in order and once each, that
+        are not in the sorted closed file. """
+        closed = self.read_records(closed_file)
+        closed_record = next(closed, None)
+        last = None
+        for record in heapq.merge(*[self.read_records(run) for run in runs]):
+            if record == last:
+                self.statistics.duplicates += 1
+                continue
+            last = record
+            while closed_record is not None and closed_record < record:
+                closed_record = next(closed, None)
+            if record == closed_record:
+                self.statistics.duplicates += 1
+                continue
+            yield record
+
+    def path( self, initial_state, layers, goal_state ):
+        """ Returns the path to the goal state of the last layer. A state of
+        each layer that has the state of the next layer as successor is
+        found by scanning the layer, from the goal to the initial state. The
+        actions are then replayed from the initial state, because the states
+        of the files may not have the player where the actions put it. """
+        states = [goal_state]
+        for layer in reversed(layers[:-1]):
+            for record in self.read_records(layer):
+                state = self.decode(goal_state.board, record)
+                if any(next_state == states[-1] for next_state, direction, weight in state.get_successor_states()):
+                    states.append(state)
+                    break
+        states.reverse()
+        path = []
+        current_state = initial_state
+        for state in states[1:]:
+            for next_state, direction, weight in current_state.get_successor_states():
+                if next_state == state:
+                    path.append(direction)
+                    current_state = next_state
+                    break
+        return expand_actions(path)
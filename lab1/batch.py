@@ -0,0 +1,179 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file batch.py
+#
+# @author Régis Clouard
+
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import utils
+from utils import TimeoutFunctionException, TimeoutFunction, SearchStatistics
+from sokobanframe import SokobanState
+from solutions import SolutionCache, level_key, search_mode
+
+FIELDS = ['level', 'agent', 'status', 'length'] + SearchStatistics.FIELDS
+
+def load_state( gridfile ):
+    state = SokobanState()
+    with open(gridfile, "r") as level_file:
+        state.load_level(level_file)
+    return state
+
+def solve( job ):
+    """ Solves one level with one agent, without any display, in a worker
+    process. The path is checked by replaying it on a freshly loaded state
+    in single-step mode. With a cache, a valid stored solution is used
+    instead of searching, and a new solution is stored. Returns the row of
+    the results. """
+    gridfile, agent_name, timeout, pushes, normalize, cache_file = job
+    statistics = SearchStatistics()
+    state = load_state(gridfile)
+    state.board.push_moves = pushes or normalize
+    state.board.normalize = normalize
+    cache = SolutionCache(cache_file) if cache_file else None
+    level, mode = level_key(gridfile), search_mode(pushes, normalize, state.board)
+    path = cache.lookup(level, agent_name, mode, load_state(gridfile)) if cache else None
+    if path is not None:
+        status = 'cached'
+    else:
+        agent = getattr(__import__('agents'), agent_name)()
+        try:
+            path = TimeoutFunction(agent.solve, timeout)(state, statistics)
+            if not path:
+                status = 'no solution'
+            elif load_state(gridfile).is_solution(path):
+                status = 'solved'
+                if cache:
+                    cache.put(level, agent_name, mode, path)
+            else:
+                status = 'invalid'
+        except TimeoutFunctionException:
+            path = []
+            status = 'timeout'
+    if cache:
+        cache.close()
+    row = statistics.as_dict()
+    row['wall_time'] = round(row['wall_time'], 3)
+    row['cpu_time'] = round(row['cpu_time'], 3)
+    row['suboptimality'] = round(row['suboptimality'], 3)
+    row.update({'level': os.path.basename(gridfile),
+                'agent': agent_name,
+                'status': status,
+                'length': len(path)})
+    return row
+
+def set_heuristic_cache( capacity ):
+    """ Sets the size of the heuristic cache of a worker process, which is
+    shared by all the levels and agents solved by the worker. """
+    utils.HEURISTIC_CACHE.capacity = capacity
+
+def run_batch( gridfiles, agents, timeout, jobs, output, pushes, normalize, cache, heuristic_cache ):
+    """ Solves every level with every agent on jobs worker processes and
+    writes one row per (level, agent), as CSV or as JSON lines when the
+    output file ends with .json. """
+    tasks = [(gridfile, agent, timeout, pushes, normalize, cache) for gridfile in gridfiles for agent in agents]
+    out = open(output, 'w', newline = '') if output else sys.stdout
+    as_json = output is not None and output.endswith('.json')
+    if not as_json:
+        writer = csv.DictWriter(out, fieldnames = FIELDS)
+        writer.writeheader()
+    pool = multiprocessing.Pool(jobs, set_heuristic_cache, (heuristic_cache,))
+    try:
+        for row in pool.imap(solve, tasks):
+            if as_json:
+                out.write(json.dumps(row) + '\n')
+            else:
+                writer.writerow(row)
+            out.flush()
+    finally:
+        pool.terminate()
+        pool.join()
+        if output:
+            out.close()
+
+def default( str ):
+    return str + ' [Default: %default]'
+
+def read_command( argv ):
+    """ Processes the command used to run batch from the command line. """
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python batch.py <options>
+    EXAMPLES:   python batch.py --agents ASS,GBFS --grids puzzles
+                OR  python batch.py -a BFS -g 'puzzles/puzzle[1-4].txt' -o results.json
+                    - solve the puzzles with the agents, without display
+    """
+    parser = OptionParser(usageStr)
+
+    parser.add_option('-a', '--agents', dest = 'agents',
+                      help = default('Comma-separated list of agents'), default = 'ASS,GBFS')
+    parser.add_option('-g', '--grids', dest = 'grids',
+                      help = default('Directory or glob pattern of the level files'), default = 'puzzles')
+    parser.add_option('-t', '--timeout', dest = 'timeout', type = 'int',
+                      help = default('Time limit of each search in seconds'), default = 60)
+    parser.add_option('-j', '--jobs', dest = 'jobs', type = 'int',
+                      help = default('Number of worker processes'), default = multiprocessing.cpu_count())
+    parser.add_option('-o', '--output', dest = 'output',
+                      help = 'CSV file, or JSON lines if it ends with .json [Default: CSV on the standard output]', default = None)
+    parser.add_option('-p', '--pushes', dest = 'pushes', action = 'store_true',
+                      help = 'Search over crate pushes instead of single steps', default = False)
+    parser.add_option('-n', '--normalize', dest = 'normalize', action = 'store_true',
+                      help = 'Search over pushes and merge the states whose player can walk to each other', default = False)
+    parser.add_option('--cache', dest = 'cache',
+                      help = 'The database of the solutions already found, to use and fill; '
+                      'the cached rows have no search statistics [Default: no cache]', default = None)
+    parser.add_option('--heuristic-cache', dest = 'heuristic_cache', type = 'int',
+                      help = default('Number of crate layouts whose heuristic is kept by each worker'),
+                      default = utils.HEURISTIC_CACHE.capacity)
+
+    options, otherjunk = parser.parse_args(argv)
+
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    if os.path.isdir(options.grids):
+        gridfiles = sorted(glob.glob(os.path.join(options.grids, '*.txt')))
+    else:
+        gridfiles = sorted(glob.glob(options.grids))
+    if not gridfiles:
+        raise Exception('No level file: ' + options.grids)
+    agents = options.agents.split(',')
+    module = __import__('agents')
+    for name in agents:
+        if name not in dir(module):
+            raise Exception('Unknown agent: ' + name)
+    args = dict()
+    args['gridfiles'] = gridfiles
+    args['agents'] = agents
+    args['timeout'] = options.timeout
+    args['jobs'] = options.jobs
+    args['output'] = options.output
+    args['pushes'] = options.pushes
+    args['normalize'] = options.normalize
+    args['cache'] = options.cache
+    args['heuristic_cache'] = options.heuristic_cache
+    return args
+
+if __name__ == '__main__':
+    """ The main function called when batch.py is run
+    from the command line:
+
+    > python batch.py
+
+    See the usage string for more details.
+
+    > python batch.py --help
+    > python batch.py -h """
+    args = read_command( sys.argv[1:] ) # Get the batch components based on input
+    run_batch( **args )
@@ -0,0 +1,152 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file deadlocks.py
+#
+# @author Régis Clouard
+
+import itertools
+import os
+import sys
+import time
+from sokobanframe import SokobanState
+from utils import PriorityQueue
+
+def make_state( board, player, cells ):
+    """ Returns the state with the player and crates in the given cells. """
+    state = SokobanState(board, player)
+    for cell in cells:
+        state.crates |= board.bits[cell]
+        state.crate_hash ^= board.crate_keys[cell]
+    return state
+
+def configurations( board, number_of_crates, window ):
+    """ Yields the sets of number_of_crates live cells that fit in a
+    window x window square of the level, each set once. """
+    seen = set()
+    for row in range(board.height):
+        for column in range(board.width):
+            cells = [board.cell(row + y, column + x)
+                     for y in range(window) for x in range(window)
+                     if row + y < board.height and board.live[board.cell(row + y, column + x)]]
+            for crates in itertools.combinations(cells, number_of_crates):
+                if crates not in seen:
+                    seen.add(crates)
+                    yield crates
+
+def can_be_solved( state, node_limit ):
+    """ Searches for a placement of the crates of the state in holes.
+    Returns False only if the search space is exhausted without finding
+    one, True if one is found or the node limit is reached. """
+    board = state.board
+    open_list = PriorityQueue()
+    open_list.push(state, state.heuristic3())
+    closed_list = set([state])
+    while not open_list.isEmpty():
+        current_state, priority = open_list.pop()
+        if current_state.crates & board.holes == current_state.crates:
+            return True
+        if len(closed_list) > node_limit:
+            return True
+        for next_state, action, cost in current_state.get_push_successor_states():
+            if next_state not in closed_list:
+                closed_list.add(next_state)
+                open_list.push(next_state, next_state.heuristic3())
+    return False
+
+def is_deadlocked( board, cells, node_limit ):
+    """ Returns True if the crates in the cells, alone on the board, can
+    never all be pushed in holes, wherever the player stands. """
+    explored = set(cells)
+    for player in range(len(board.walls)):
+        if not board.walls[player] and player not in explored:
+            state = make_state(board, player, cells)
+            explored.update(state.reachable_cells())
+            if can_be_solved(state, node_limit):
+                return False
+    return True
+
+def find_deadlocks( board, max_crates, window, node_limit ):
+    """ Returns the deadlock patterns, as lists of cells, made of 2 to
+    max_crates crates (and at most one per hole) in a window x window
+    square. A pattern is kept only when none of its crates is already
+    detected by is_deadlock(), so the patterns do not contain smaller
+    ones. """
+    patterns = []
+    max_crates = min(max_crates, len(board.hole_cells))
+    for number_of_crates in range(2, max_crates + 1):
+        for cells in configurations(board, number_of_crates, window):
+            state = make_state(board, cells[0], cells)
+            if any(state.is_deadlock(cell) for cell in cells):
+                continue
+            if is_deadlocked(board, cells, node_limit):
+                patterns.append(list(cells))
+                board.add_deadlock_pattern(cells)
+    return patterns
+
+def build_database( gridfile, max_crates, window, node_limit ):
+    start_time = time.time()
+    state = SokobanState()
+    state.load_level(open(gridfile, "r"))
+    board = state.board
+    board.push_moves = True
+    board.normalize = True
+    board.macro_moves = False # a pattern is a deadlock for all the pushes
+    board.deadlock_patterns = {} # start again from scratch
+    patterns = find_deadlocks(board, max_crates, window, node_limit)
+    board.save_deadlock_patterns(patterns)
+    print("%s: %d patterns in %.1f s -> %s" % (gridfile, len(patterns), time.time() - start_time, board.deadlock_file()))
+
+def default( str ):
+    return str + ' [Default: %default]'
+
+def read_command( argv ):
+    """ Processes the command used to run deadlocks from the command line. """
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python deadlocks.py <options>
+    EXAMPLES:   python deadlocks.py --grid puzzle10.txt
+                OR  python deadlocks.py
+                    - find the deadlock patterns of all the puzzles
+    """
+    parser = OptionParser(usageStr)
+
+    parser.add_option('-g', '--grid', dest = 'grid',
+                      help = 'The grid to analyse (all the puzzles by default)', default = None)
+    parser.add_option('-c', '--crates', dest = 'crates', type = 'int',
+                      help = default('Maximum number of crates in a pattern'), default = 3)
+    parser.add_option('-w', '--window', dest = 'window', type = 'int',
+                      help = default('Size of the square that holds a pattern'), default = 3)
+    parser.add_option('-n', '--nodes', dest = 'nodes', type = 'int',
+                      help = default('Node limit of the search that proves a deadlock'), default = 300)
+
+    options, otherjunk = parser.parse_args(argv)
+
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    if options.grid:
+        gridfiles = ["puzzles/" + options.grid]
+    else:
+        gridfiles = sorted("puzzles/" + name for name in os.listdir("puzzles") if name.endswith(".txt"))
+    return gridfiles, options.crates, options.window, options.nodes
+
+if __name__ == '__main__':
+    """ The main function called when deadlocks.py is run
+    from the command line:
+
+    > python deadlocks.py
+
+    See the usage string for more details.
+
+    > python deadlocks.py --help
+    > python deadlocks.py -h """
+    gridfiles, max_crates, window, node_limit = read_command( sys.argv[1:] )
+    for gridfile in gridfiles:
+        build_database(gridfile, max_crates, window, node_limit)
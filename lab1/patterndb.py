@@ -0,0 +1,131 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file patterndb.py
+#
+# @author Régis Clouard
+
+import itertools
+import os
+import sys
+import time
+from array import array
+from sokobanframe import SokobanState, NO_PATTERN_PATH
+from deadlocks import make_state
+
+def pattern_holes( board ):
+    """ Splits the holes in pairs, the closest ones first, since the crates
+    of close holes get in each other's way. With an odd number of holes,
+    the last one is alone. """
+    def distance( pair ):
+        (row1, column1), (row2, column2) = board.position(pair[0]), board.position(pair[1])
+        return abs(row1 - row2) + abs(column1 - column2)
+    holes = set(board.hole_cells)
+    patterns = []
+    for pair in sorted(itertools.combinations(board.hole_cells, 2), key = distance):
+        if pair[0] in holes and pair[1] in holes:
+            holes.difference_update(pair)
+            patterns.append(pair)
+    patterns.extend((hole,) for hole in sorted(holes))
+    return patterns
+
+def build_table( board, holes ):
+    """ Returns the table of the pattern of the holes: the exact number of
+    pushes that brings crates in all the holes, for every placement of as
+    many crates on live cells, when there is no other crate and the player
+    stands at the best place. It is found by a breadth-first search that
+    pulls the crates out of the holes, from every region of the player. A
+    placement is indexed by the numbers of its cells in board.live_cells
+    (see SokobanBoard.pattern_index()), in every order. """
+    live_index = board.live_index
+    table = array('H', [NO_PATTERN_PATH]) * (len(board.live_cells) ** len(holes))
+    explored = set(holes)
+    layer = []
+    for cell in range(len(board.walls)):
+        if not board.walls[cell] and cell not in explored:
+            state = make_state(board, cell, holes)
+            explored.update(state.reachable_cells())
+            layer.append(state)
+    closed_list = set(layer)
+    pushes = 0
+    while layer:
+        next_layer = []
+        for state in layer:
+            indices = [live_index[cell] for cell in state.crate_cells()]
+            for permutation in itertools.permutations(indices):
+                index = board.pattern_index(permutation)
+                if table[index] == NO_PATTERN_PATH:
+                    table[index] = pushes
+            for next_state, action, cost in state.get_pull_successor_states():
+                if next_state not in closed_list and all(board.live[cell] for cell in next_state.crate_cells()):
+                    closed_list.add(next_state)
+                    next_layer.append(next_state)
+        layer = next_layer
+        pushes += 1
+    return table
+
+def build_database( gridfile, max_crates ):
+    start_time = time.time()
+    state = SokobanState()
+    state.load_level(open(gridfile, "r"))
+    board = state.board
+    if len(state.crate_cells()) > max_crates:
+        print("%s: more than %d crates, no pattern database" % (gridfile, max_crates))
+        return
+    board.push_moves = True
+    board.normalize = True # the player is identified by its region
+    patterns = []
+    for holes in pattern_holes(board):
+        patterns.append((holes, build_table(board, holes)))
+    board.save_pattern_database(patterns)
+    print("%s: %d patterns in %.1f s -> %s" % (gridfile, len(patterns), time.time() - start_time, board.pattern_database_file()))
+
+def default( str ):
+    return str + ' [Default: %default]'
+
+def read_command( argv ):
+    """ Processes the command used to run patterndb from the command line. """
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python patterndb.py <options>
+    EXAMPLES:   python patterndb.py --grid puzzle10.txt
+                OR  python patterndb.py
+                    - build the pattern databases of all the puzzles
+    """
+    parser = OptionParser(usageStr)
+
+    parser.add_option('-g', '--grid', dest = 'grid',
+                      help = 'The grid to analyse (all the puzzles by default)', default = None)
+    parser.add_option('-c', '--crates', dest = 'crates', type = 'int',
+                      help = default('Maximum number of crates of a level, the heuristic is exponential in it'), default = 10)
+
+    options, otherjunk = parser.parse_args(argv)
+
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    if options.grid:
+        gridfiles = ["puzzles/" + options.grid]
+    else:
+        gridfiles = sorted("puzzles/" + name for name in os.listdir("puzzles") if name.endswith(".txt"))
+    return gridfiles, options.crates
+
+if __name__ == '__main__':
+    """ The main function called when patterndb.py is run
+    from the command line:
+
+    > python patterndb.py
+
+    See the usage string for more details.
+
+    > python patterndb.py --help
+    > python patterndb.py -h """
+    gridfiles, max_crates = read_command( sys.argv[1:] )
+    for gridfile in gridfiles:
+        build_database(gridfile, max_crates)
@@ -15,14 +15,64 @@
 import os
 import sys
 import time
+import multiprocessing
 from utils import TimeoutFunctionException, TimeoutFunction
 from sokobanframe import SokobanFrame
+from utils import SearchStatistics
+from solutions import SolutionCache, level_key, search_mode
 
-def search_path( sokoban, agent ):
+PORTFOLIO = ['ASS', 'GBFS', 'IDASS', 'WASS']
+
+def run_search( job ):
+    """ Runs an agent in a worker process of the portfolio. """
+    agent, state = job
+    path = agent.solve(state)
+    return (agent, path)
+
+class Portfolio:
+    """
+    Runs several agents at the same time, one per process, and returns the
+    first valid solution. The other agents are then stopped.
+    """
+    def __init__( self, agents ):
+        self.agents = agents
+        self.statistics = SearchStatistics()
+
+    def solve( self, initial_state ):
+        """ Returns the first valid path. The statistics are those of the
+        agent that found it, with the wall-clock time of the whole race. """
+        start_time = time.time()
+        self.statistics = SearchStatistics()
+        path = self.search(initial_state)
+        self.statistics.wall_time = time.time() - start_time
+        return path
+
+    def search( self, initial_state ):
+        pool = multiprocessing.Pool(len(self.agents))
+        try:
+            jobs = [(agent, initial_state) for agent in self.agents]
+            for agent, path in pool.imap_unordered(run_search, jobs):
+                if path and initial_state.is_solution(path):
+                    print("Portfolio: solution found by %s" % agent.__class__.__name__)
+                    self.statistics = agent.statistics
+                    return path
+            return []
+        finally:
+            pool.terminate()
+            pool.join()
+
+def search_path( sokoban, agent, cache = None, level = None, mode = None ):
+    name = agent.__class__.__name__
+    if cache:
+        path = cache.lookup(level, name, mode, sokoban.get_start_state())
+        if path is not None:
+            print("Solution found in the cache.")
+            print("    - Number of moves         : %3d\n" % len(path))
+            sokoban.display_path(path)
+            return
     print("Searching.. "),
     sys.stdout.flush()
-    starttime = time.time()
-    timed_func = TimeoutFunction(agent.search, 1000)
+    timed_func = TimeoutFunction(agent.solve, 1000)
     try:
         path = timed_func(sokoban.get_start_state())
         print("Done.")
@@ -30,11 +80,22 @@ def search_path( sokoban, agent ):
         print("Error #1: time out", ex)
         path = []
     if path:
+        if cache and sokoban.get_start_state().is_solution(path):
+            cache.put(level, name, mode, path)
+        number_of_moves = len(path)
         if sokoban.display_path(path):
+            statistics = agent.statistics
             print("Statistics:")
-            print('    - Time                    : %.1f s' % (time.time() - starttime))
-            print("    - Number of explored nodes: %3d" % SokobanFrame.number_of_explored_nodes)
-            print("    - Number of moves         : %3d\n" % len(path))
+            print('    - Time                    : %.1f s (CPU %.1f s)' % (statistics.wall_time, statistics.cpu_time))
+            print("    - Number of explored nodes: %3d" % statistics.expanded)
+            print("    - Number of generated nodes: %3d (%d duplicates)" % (statistics.generated, statistics.duplicates))
+            print("    - Largest frontier        : %3d" % statistics.max_frontier)
+            print("    - Largest closed set      : %3d" % statistics.max_closed)
+            print("    - Heuristic evaluations   : %3d" % statistics.heuristic_calls)
+            print("    - Heuristic cache         : %d hits, %d misses" % (statistics.cache_hits, statistics.cache_misses))
+            if statistics.suboptimality:
+                print("    - Suboptimality bound     : %.2f" % statistics.suboptimality)
+            print("    - Number of moves         : %3d\n" % number_of_moves)
         else:
             sokoban.game_over()
             print("FAILED : Inconsistant solution.")
@@ -42,17 +103,22 @@ def search_path( sokoban, agent ):
         sokoban.game_over()
         print("FAILED: No solution.")
 
-def run_agent( agent, gridfile, framerate, function = None ):
+def run_agent( agent, gridfile, framerate, function = None, pushes = False, normalize = False, cache = None ):
     """ The real main. """
 
-    number_of_explored_nodes = 0
     if not agent: # by hand
         sokoban = SokobanFrame(gridfile, agent, function, framerate)
         sokoban.bind_all("<Key>", sokoban.key)
         sokoban.mainloop()
     else:
         sokoban = SokobanFrame(gridfile, agent, function, framerate)
-        sokoban.after(1500, search_path, sokoban, agent)
+        board = sokoban.get_start_state().board
+        board.push_moves = pushes or normalize
+        board.normalize = normalize
+        if cache:
+            sokoban.after(1500, search_path, sokoban, agent, SolutionCache(cache), level_key(gridfile), search_mode(pushes, normalize, board))
+        else:
+            sokoban.after(1500, search_path, sokoban, agent)
         sokoban.mainloop()
 
 def default(str):
@@ -70,7 +136,7 @@ def read_command( argv ):
     parser = OptionParser(usageStr)
     
     parser.add_option('-a', '--agent', dest = 'agent',
-                      help = default('the agent to use'),
+                      help = default('the agent to use, or a comma-separated list of agents with --portfolio'),
                       metavar = 'TYPE', default = None)
     parser.add_option('-g', '--grid', dest = 'grid',
                       help = 'The grid to solve', default = 'puzzle1.txt')
@@ -78,6 +144,14 @@ def read_command( argv ):
                       help = 'The heuristic to use', default = None)
     parser.add_option('-t', '--framerate', dest = 'framerate',
                       help=default('Maximum frame rate time'), default = 200)
+    parser.add_option('-p', '--pushes', dest = 'pushes', action = 'store_true',
+                      help = 'Search over crate pushes instead of single steps', default = False)
+    parser.add_option('-n', '--normalize', dest = 'normalize', action = 'store_true',
+                      help = 'Search over pushes and merge the states whose player can walk to each other', default = False)
+    parser.add_option('--portfolio', dest = 'portfolio', action = 'store_true',
+                      help = 'Race several agents in parallel (%s by default)' % ','.join(PORTFOLIO), default = False)
+    parser.add_option('--cache', dest = 'cache',
+                      help = 'The database of the solutions already found, to use and fill [Default: no cache]', default = None)
     
     options, otherjunk = parser.parse_args(argv)
 
@@ -87,18 +161,30 @@ def read_command( argv ):
     
     args['gridfile'] = "puzzles/" + options.grid
     args['framerate'] = int(options.framerate)
+    args['pushes'] = options.pushes
+    args['normalize'] = options.normalize
+    if options.portfolio and not options.agent:
+        options.agent = ','.join(PORTFOLIO)
     if not options.agent:
         args['agent'] = None
         return args
+    args['cache'] = options.cache
     try:
         module = __import__('agents')
-        if options.agent in dir(module):
-            agent = getattr(module, options.agent)
-            args['agent'] = agent()
-        else:
-            raise Exception('Unknown agent: ' + options.agent)
+        agents = []
+        for name in options.agent.split(','):
+            if name in dir(module):
+                agents.append(getattr(module, name)())
+            else:
+                raise Exception('Unknown agent: ' + name)
     except ImportError:
         raise Exception('No file agents.py')
+    if options.portfolio:
+        args['agent'] = Portfolio(agents)
+    elif len(agents) == 1:
+        args['agent'] = agents[0]
+    else:
+        raise Exception('Several agents need --portfolio: ' + options.agent)
     
     # Choose a heuristic
     if options.function != None:
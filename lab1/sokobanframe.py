@@ -18,17 +18,16 @@ if sys.version_info.major >= 3:
 else:
     import Tkinter as tk
 import threading
-import copy
+import hashlib
+import itertools
+import random
 import time
 import os
+from array import array
+from utils import Assignment, HEURISTIC_CACHE
 
 _ROOT = os.path.abspath(os.path.dirname(__file__))
 
-def enum(**enums):
-    return type('Enum', (), enums)
-
-Hole = enum(filled = True, empty = False)
-
 class Direction( object ):
     left = 'Left'
     right = 'Right'
@@ -52,7 +51,6 @@ class Image( object ):
     player_in_hole = os.path.join(_ROOT, 'images/player-in-hole.gif')
 
 class SokobanFrame( tk.Frame, threading.Thread ):
-    number_of_explored_nodes = 0
     number_of_moves = 0
 
     def __init__(self, gridfile, solver, function, timeout):
@@ -86,163 +84,65 @@ class SokobanFrame( tk.Frame, threading.Thread ):
         self.display_level()
 
     def display_level( self ):
-        for row, line in enumerate(self.current_state.level):
-            level_row = list(line)
-
+        board = self.current_state.board
+        for row, line in enumerate(board.level):
             for column, char in enumerate(line):
                 if char == Level.wall:
-                    wall = tk.PhotoImage(file = Image.wall)
-                    w = tk.Label(self.frame, image = wall, borderwidth = 0)
-                    w.wall = wall
-                    w.grid(row = row, column = column)
-
+                    self.draw_cell(Image.wall, row, column)
                 elif char == Level.hole:
-                    hole = tk.PhotoImage(file = Image.hole)
-                    w = tk.Label(self.frame, image = hole, borderwidth = 0)
-                    w.hole = hole
-                    w.grid(row = row, column = column)
-
-                elif char == Level.crate_in_hole:
-                    crate_in_hole = tk.PhotoImage(file = Image.crate_in_hole)
-                    w = tk.Label(self.frame, image = crate_in_hole, borderwidth = 0)
-                    w.crate_in_hole = crate_in_hole
-                    w.grid(row = row, column = column)
-                    self.crates[(row, column)] = w
-
-                elif char == Level.crate:
-                    crate = tk.PhotoImage(file = Image.crate)
-                    w = tk.Label(self.frame, image = crate, borderwidth = 0)
-                    w.crate = crate
-                    w.grid(row = row, column = column)
-                    self.crates[(row, column)] = w
-        (row, column) = self.current_state.player_position
-        player_image = tk.PhotoImage(file = Image.player)
-        self.player = tk.Label(self.frame, image = player_image, borderwidth = 0)
-        self.player.player_image = player_image
-        self.player.grid(row = row, column = column)
-
-    def move_player( self, direction ):
+                    self.draw_cell(Image.hole, row, column)
+        for cell in self.current_state.crate_cells():
+            self.draw_crate(cell)
+        self.draw_player()
+
+    def draw_cell( self, image_file, row, column ):
+        image = tk.PhotoImage(file = image_file)
+        w = tk.Label(self.frame, image = image, borderwidth = 0)
+        w.image = image
+        w.grid(row = row, column = column)
+        return w
+
+    def draw_crate( self, cell ):
+        board = self.current_state.board
+        row, column = board.position(cell)
+        if board.holes & board.bits[cell]:
+            self.crates[(row, column)] = self.draw_cell(Image.crate_in_hole, row, column)
+        else:
+            self.crates[(row, column)] = self.draw_cell(Image.crate, row, column)
+
+    def draw_player( self ):
+        board = self.current_state.board
         row, column = self.current_state.player_position
-        prev_row, prev_column = row, column
-
-        blocked = True
-        if direction == Direction.left and self.current_state.level[row][column - 1] is not Level.wall and column > 0:
-            blocked = self.move_crate((row, column - 1), (row, column - 2))
-            if not blocked:
-                self.current_state.player_position = (row, column - 1)
-        elif direction == Direction.right and self.current_state.level[row][column + 1] is not Level.wall:
-            blocked = self.move_crate((row, column + 1), (row, column + 2))
-            if not blocked:
-                self.current_state.player_position = (row, column + 1)
-        elif direction == Direction.down and self.current_state.level[row + 1][column] is not Level.wall:
-            blocked = self.move_crate((row + 1, column), (row + 2, column))
-            if not blocked:
-                self.current_state.player_position = (row + 1, column)
-        elif direction == Direction.up and self.current_state.level[row - 1][column] is not Level.wall and row > 0:
-            blocked = self.move_crate((row - 1, column), (row - 2, column))
-            if not blocked:
-                self.current_state.player_position = (row - 1, column)
-
-        if self.current_state.is_goal_state():
-            self.game_win()
-            return True
-
-        if blocked:
-            return False
-
-        row, column = self.current_state.player_position
-        if self.current_state.level[prev_row][prev_column] is Level.hole and not blocked:
-            hole = tk.PhotoImage(file = Image.hole)
-            w = tk.Label(self.frame, image = hole, borderwidth = 0)
-            w.hole = hole
-            w.grid(row = prev_row, column = prev_column)
-
-        if not blocked:
+        if self.player:
             self.player.grid_forget()
+        if board.holes & board.bits[self.current_state.player]:
+            self.player = self.draw_cell(Image.player_in_hole, row, column)
+        else:
+            self.player = self.draw_cell(Image.player, row, column)
 
-            if self.current_state.level[row][column] is Level.hole:
-                player_image = tk.PhotoImage(file = Image.player_in_hole)
-            else:
-                player_image = tk.PhotoImage(file = Image.player)
-
-            self.player = tk.Label(self.frame, image = player_image, borderwidth = 0)
-            self.player.player_image = player_image
-            self.player.grid(row = row, column = column)
+    def move_player( self, direction ):
+        """ Plays the move on the board. Contrary to the search, the
+        player is allowed to push a crate in a dead cell. """
+        state = self.current_state
+        next_state = state.move_player(direction, False)
+        if next_state is None:
+            return state.is_goal_state()
+
+        board = state.board
+        if board.holes & board.bits[state.player]:
+            self.draw_cell(Image.hole, *state.player_position)
+        moved = state.crates & ~next_state.crates
+        if moved:
+            self.crates.pop(board.position(moved.bit_length() - 1)).grid_forget()
+        self.current_state = next_state
+        if moved:
+            self.draw_crate((next_state.crates & ~state.crates).bit_length() - 1)
+        self.draw_player()
+
+        if next_state.is_goal_state():
+            self.game_win()
         return True
 
-    def move_crate( self, location, next_location ):
-        row, column = location
-        next_row, next_column = next_location
-
-        if self.current_state.level[row][column] is Level.crate and self.current_state.level[next_row][next_column] is Level.floor:
-            self.crates[(row, column)].grid_forget()
-            crate = tk.PhotoImage(file = Image.crate)
-            w = tk.Label(self.frame, image = crate, borderwidth = 0)
-            w.crate = crate
-            w.grid(row = next_row, column = next_column)
-
-            self.crates[(next_row, next_column)] = w
-            self.current_state.level[row][column] = Level.floor
-            self.current_state.level[next_row][next_column] = Level.crate
-
-        elif self.current_state.level[row][column] is Level.crate and self.current_state.level[next_row][next_column] is Level.hole:
-            self.crates[(row, column)].grid_forget()
-            crate_in_hole = tk.PhotoImage(file = Image.crate_in_hole)
-            w = tk.Label(self.frame, image = crate_in_hole, borderwidth = 0)
-            w.crate = crate_in_hole
-            w.grid(row = next_row, column = next_column)
-
-            self.crates[(next_row, next_column)] = w
-            self.current_state.level[row][column] = Level.floor
-            self.current_state.level[next_row][next_column] = Level.crate_in_hole
-            self.current_state.holes[(next_row, next_column)] = Hole.filled
-
-        elif self.current_state.level[row][column] is Level.crate_in_hole and self.current_state.level[next_row][next_column] is Level.floor:
-            self.crates[(row, column)].grid_forget()
-            crate = tk.PhotoImage(file = Image.crate)
-            w = tk.Label(self.frame, image = crate, borderwidth = 0)
-            w.crate = crate
-            w.grid(row = next_row, column = next_column)
-
-            self.crates[(next_row, next_column)] = w
-            self.current_state.level[row][column] = Level.hole
-            self.current_state.level[next_row][next_column] = Level.crate
-            self.current_state.holes[(row, column)] = Hole.empty
-
-        elif self.current_state.level[row][column] is Level.crate_in_hole and self.current_state.level[next_row][next_column] is Level.hole:
-            self.crates[(row, column)].grid_forget()
-            crate_in_hole = tk.PhotoImage(file = Image.crate_in_hole)
-            w = tk.Label(self.frame, image = crate_in_hole, borderwidth = 0)
-            w.crate_in_hole = crate_in_hole
-            w.grid(row = next_row, column = next_column)
-
-            self.crates[(next_row, next_column)] = w
-            self.current_state.level[row][column] = Level.hole
-            self.current_state.level[next_row][next_column] = Level.crate_in_hole
-            self.current_state.holes[(row, column)] = Hole.empty
-            self.current_state.holes[(next_row, next_column)] = Hole.filled
-
-        if self.is_blocked(location, next_location):
-            return True
-        return False
-
-    def is_blocked( self, location, next_location ):
-        row, column = location
-        next_row, next_column = next_location
-
-        if self.current_state.level[row][column] is Level.crate and self.current_state.level[next_row][next_column] is Level.wall:
-            return True
-        elif self.current_state.level[row][column] is Level.crate_in_hole and self.current_state.level[next_row][next_column] is Level.wall:
-            return True
-        elif (self.current_state.level[row][column] is Level.crate_in_hole and
-                  (self.current_state.level[next_row][next_column] is Level.crate or
-                           self.current_state.level[next_row][next_column] is Level.crate_in_hole)):
-            return True
-        elif (self.current_state.level[row][column] is Level.crate and
-                  (self.current_state.level[next_row][next_column] is Level.crate or
-                           self.current_state.level[next_row][next_column] is Level.crate_in_hole)):
-            return True
-
     def game_over( self ):
         inlay = tk.PhotoImage(file = 'images/gameover.gif')
         w = tk.Label(self.master, image=inlay)
@@ -270,55 +170,329 @@ class SokobanFrame( tk.Frame, threading.Thread ):
         return True
 
 DEAD_CELL = -1
+UNREACHABLE = 1000000 # push distance of a cell from which a hole cannot be reached
+NO_PATTERN_PATH = 65535 # value of the pattern tables when the holes cannot be filled
 
-class SokobanState( ):
+class SokobanBoard( object ):
     """
-    A search problem defines the state space, start state, goal test,
-    successor function and cost function.  This search problem can be
-    used to find paths to a particular point on the sokoban board.
+    The static part of a level: walls, holes and dead cells. It is built
+    once by SokobanState.load_level() and shared by all the states of a search.
 
-    The state space consists of (x,y) position in a sokoban and the board (level, holes).
+    Cells are numbered row by row, so that moving in a direction is just
+    adding an offset to a cell number. The board is padded with walls so that
+    the neighbours of a cell always exist.
 
-    Note: this search problem is fully specified; you should NOT change it.
+    The keys of the Zobrist hashing of the states are drawn from a
+    generator seeded by the board size, so hashes do not depend on
+    PYTHONHASHSEED.
     """
 
-    def __init__( self ):
-        self.player_position = ()
-        self.level = []
-        self.holes = {}
-        self.dead_map = []
-
-    def __deepcopy__(self, memo):
-        state = SokobanState()
-        state.level = copy.deepcopy(self.level, memo)
-        state.player_position = copy.deepcopy(self.player_position, memo)
-        state.holes = copy.deepcopy(self.holes, memo)
-        state.dead_map = self.dead_map # shared
-        return state
-
-    def __eq__( self, other ):
-        return self.player_position == other.player_position and self.level == other.level
-
-    def __hash__( self ):
-        l = [item for sublist in self.level for item in sublist]
-        return hash((self.player_position, tuple(l)))
-
-    def load_level( self, level_file ):
-        for row, line in enumerate(level_file):
-            level_row = list(line)
-            for column, x in enumerate(level_row):
-                if x == Level.player:
-                    level_row[column] = Level.floor
-                    self.player_position = (row, column)
-
-                elif x == Level.hole:
-                    self.holes[(row, column)] = Hole.empty
-
-                elif x == Level.crate_in_hole:
-                    self.holes[(row, column)] = Hole.filled
-
-            self.level.append(level_row)
+    def __init__( self, level ):
+        self.level = level # the level without the crates and the player
+        self.push_moves = False # successors are single steps or whole pushes
+        self.normalize = False # in push mode, identify the player by its region
+        self.macro_moves = True # in push mode, push through tunnels and into the goal room at once
+        self.height = len(level)
+        self.width = max(len(line) for line in level) + 1
+        self.moves = ((Direction.left, -1), (Direction.right, 1),
+                      (Direction.up, -self.width), (Direction.down, self.width))
+        self.offsets = dict(self.moves)
+        self.actions = dict((offset, action) for action, offset in self.moves)
+        size = (self.height + 2) * self.width
+        self.bits = [1 << cell for cell in range(size)]
+        self.walls = [True] * size
+        self.holes = 0 # bitmask of the holes
+        for row, line in enumerate(level):
+            for column, x in enumerate(line):
+                cell = self.cell(row, column)
+                self.walls[cell] = x == Level.wall
+                if x == Level.hole:
+                    self.holes |= self.bits[cell]
+        self.hole_cells = tuple(cell for cell in range(size) if self.holes & self.bits[cell])
         self.mark_dead_cells()
+        # live[cell] is True when a crate can be pushed in the cell.
+        self.live = [False] * size
+        for row, line in enumerate(self.dead_map):
+            for column, x in enumerate(line):
+                self.live[self.cell(row, column)] = x == 1
+        self.compute_push_distances()
+        self.live_cells = [cell for cell in range(size) if self.live[cell]]
+        self.live_index = dict((cell, index) for index, cell in enumerate(self.live_cells))
+        self.find_tunnels()
+        self.room = 0 # bitmask of the goal room, see find_goal_room()
+        # the level key identifies the walls and holes of the level
+        layout = '\n'.join(''.join(line).rstrip() for line in level)
+        self.key = hashlib.sha1(layout.encode('utf-8')).hexdigest()
+        self.load_deadlock_patterns()
+        self.load_pattern_database()
+        # Zobrist keys: the hash of a state is the xor of the keys of its
+        # crates and player, so a move updates it with two or three xors.
+        generator = random.Random(size)
+        self.crate_keys = [generator.getrandbits(60) for cell in range(size)]
+        self.player_keys = [generator.getrandbits(60) for cell in range(size)]
+
+    def cell( self, row, column ):
+        return (row + 1) * self.width + column
+
+    def position( self, cell ):
+        row, column = divmod(cell, self.width)
+        return (row - 1, column)
+
+    def compute_push_distances( self ):
+        """ For every hole, push_distances[hole][cell] is the minimum number
+        of pushes needed to bring a crate from the cell to the hole when there
+        is no other crate. It is found by a breadth-first search that pulls a
+        crate out of the hole: a pull moves the crate one cell away from the
+        wall-free cell where the player stands after the pull.
+        nearest_hole[cell] is the distance to the closest hole, and the cells
+        from which no hole can be reached are no longer live. """
+        size = len(self.walls)
+        self.push_distances = []
+        for hole in self.hole_cells:
+            distances = [UNREACHABLE] * size
+            distances[hole] = 0
+            queue = [hole]
+            for cell in queue:
+                for action, offset in self.moves:
+                    next_cell = cell + offset
+                    if (distances[next_cell] == UNREACHABLE and not self.walls[next_cell]
+                        and not self.walls[next_cell + offset]):
+                        distances[next_cell] = distances[cell] + 1
+                        queue.append(next_cell)
+            self.push_distances.append(distances)
+        self.nearest_hole = [min(distances[cell] for distances in self.push_distances)
+                             for cell in range(size)]
+        for cell in range(size):
+            if self.nearest_hole[cell] == UNREACHABLE:
+                self.live[cell] = False
+
+    def find_tunnels( self ):
+        """ tunnels holds the pairs (cell, offset) such that the cell is in
+        a corridor one cell wide along the direction of the offset: its two
+        neighbours across the direction are walls. A crate pushed from a
+        cell of the corridor to another one is pushed again until it would
+        leave the corridor, since the player cannot go around it to do
+        anything else from there. """
+        self.tunnels = set()
+        for cell in range(self.width, len(self.walls) - self.width):
+            if not self.walls[cell]:
+                for action, offset in self.moves:
+                    side = self.width if abs(offset) == 1 else 1
+                    if self.walls[cell - side] and self.walls[cell + side]:
+                        self.tunnels.add((cell, offset))
+
+    def find_goal_room( self, player, crates ):
+        """ Looks for a goal room: the cells cut from the rest of the level by
+        a single entrance cell, which hold all the holes but neither the player
+        nor any crate, when there are as many crates as holes. The room is
+        then filled in a fixed order, found backward: the hole filled last is
+        one that a crate pushed in by any entrance can reach when the other
+        holes are filled, and so on. room_paths[(cell, k)] is the list of
+        the directions that bring the crate pushed from the entrance to the
+        cell to the k-th hole of the order, the previous ones being filled.
+        Crates in the room are not pushed again. The smallest room is kept;
+        room stays 0 when there is none or no order fills it. """
+        self.room = 0
+        self.room_paths = {}
+        if not self.hole_cells or bin(crates).count('1') != len(self.hole_cells):
+            return
+        floor = [cell for cell in range(len(self.walls)) if not self.walls[cell]]
+        rooms = []
+        for entrance in floor:
+            if self.holes & self.bits[entrance]:
+                continue
+            room = set([self.hole_cells[0]])
+            queue = [self.hole_cells[0]]
+            for cell in queue:
+                for action, offset in self.moves:
+                    next_cell = cell + offset
+                    if not self.walls[next_cell] and next_cell != entrance and next_cell not in room:
+                        room.add(next_cell)
+                        queue.append(next_cell)
+            if (player not in room and len(room) + 1 < len(floor)
+                and all(hole in room for hole in self.hole_cells)
+                and not any(crates & self.bits[cell] for cell in room)):
+                rooms.append((len(room), entrance, room))
+        for size, entrance, room in sorted(rooms):
+            # the crate is pushed from the entrance to the cell by a player
+            # standing out of the room
+            entries = [entrance + offset for action, offset in self.moves
+                       if entrance + offset in room and not self.walls[entrance - offset] and entrance - offset not in room]
+            paths = self.fill_goal_room(entrance, room, entries)
+            if entries and paths is not None:
+                self.room = sum(self.bits[cell] for cell in room)
+                self.room_paths = paths
+                # the tunnel macros stop before the entrance
+                self.tunnels = set(pair for pair in self.tunnels if pair[0] != entrance and pair[0] not in room)
+                return
+
+    def fill_goal_room( self, entrance, room, entries ):
+        """ Returns the room_paths of the room (see find_goal_room()), or
+        None if no order fills the room. """
+        holes = list(self.hole_cells)
+        order = []
+        while holes:
+            for hole in holes:
+                filled = set(holes) - set([hole])
+                # the player must walk out for the next crate, if any
+                leave = len(holes) < len(self.hole_cells)
+                paths = [self.room_push_path(entrance, cell, hole, room, filled, leave) for cell in entries]
+                if None not in paths:
+                    holes.remove(hole)
+                    order.append(paths)
+                    break
+            else:
+                return None
+        order.reverse()
+        return dict(((cell, k), paths[i]) for k, paths in enumerate(order) for i, cell in enumerate(entries))
+
+    def room_push_path( self, player, crate, hole, room, filled, leave ):
+        """ Returns the shortest list of directions that brings the crate
+        from its cell to the hole, when the player is in the given cell and
+        the crates in the filled cells do not move, or None. The player
+        does not leave the room, except for the cell it starts from, and
+        must be able to walk back to that cell at the end when leave is
+        True. There is no path when the crate or the player starts in a
+        filled cell: the entry of the room would be blocked. """
+        if crate in filled or player in filled:
+            return None
+        entrance = player
+        cells = room | set([player])
+        start = (crate, player)
+        previous = {start: None}
+        queue = [start]
+        for node in queue:
+            crate, player = node
+            if crate == hole:
+                if leave and not self.room_walk(player, entrance, cells, filled | set([hole])):
+                    continue
+                directions = []
+                while previous[node] is not None:
+                    node, action = previous[node]
+                    directions.append(action)
+                directions.reverse()
+                return directions
+            for action, offset in self.moves:
+                next_cell = player + offset
+                if next_cell == crate:
+                    next_node = (crate + offset, crate)
+                    if crate + offset not in room or crate + offset in filled:
+                        continue
+                elif next_cell not in cells or next_cell in filled:
+                    continue
+                else:
+                    next_node = (crate, next_cell)
+                if next_node not in previous:
+                    previous[next_node] = (node, action)
+                    queue.append(next_node)
+        return None
+
+    def room_walk( self, cell, target, cells, blocked ):
+        """ Returns True if the player can walk from the cell to the target
+        through the given cells, without entering the blocked ones. """
+        reachable = set([cell])
+        queue = [cell]
+        for cell in queue:
+            if cell == target:
+                return True
+            for action, offset in self.moves:
+                next_cell = cell + offset
+                if next_cell in cells and next_cell not in blocked and next_cell not in reachable:
+                    reachable.add(next_cell)
+                    queue.append(next_cell)
+        return False
+
+    def deadlock_file( self ):
+        """ Returns the file of the deadlock patterns of the level. """
+        return os.path.join(_ROOT, 'patterns', self.key + '.txt')
+
+    def load_deadlock_patterns( self ):
+        """ Loads the deadlock patterns found by deadlocks.py. Each line of
+        the file is a pattern: the row and column of each of its crates.
+        deadlock_patterns[cell] is the list of the bitmasks of the patterns
+        that have a crate in the cell. """
+        self.deadlock_patterns = {}
+        if os.path.exists(self.deadlock_file()):
+            with open(self.deadlock_file()) as pattern_file:
+                for line in pattern_file:
+                    values = [int(x) for x in line.split()]
+                    if values:
+                        self.add_deadlock_pattern([self.cell(row, column) for row, column in zip(values[0::2], values[1::2])])
+
+    def add_deadlock_pattern( self, cells ):
+        pattern = 0
+        for cell in cells:
+            pattern |= self.bits[cell]
+        for cell in cells:
+            self.deadlock_patterns.setdefault(cell, []).append(pattern)
+
+    def save_deadlock_patterns( self, patterns ):
+        """ Writes the patterns, given as lists of cells, in the file of the level. """
+        if not os.path.isdir(os.path.dirname(self.deadlock_file())):
+            os.makedirs(os.path.dirname(self.deadlock_file()))
+        with open(self.deadlock_file(), 'w') as pattern_file:
+            for cells in patterns:
+                pattern_file.write(' '.join('%d %d' % self.position(cell) for cell in cells) + '\n')
+
+    def pattern_database_file( self ):
+        """ Returns the file of the pattern database of the level. """
+        return os.path.join(_ROOT, 'patterns', self.key + '.pdb')
+
+    def pattern_index( self, indices ):
+        """ Returns the index in a pattern table of the crates whose numbers
+        in live_cells are given, in the order of the holes of the pattern. """
+        index = 0
+        for i in indices:
+            index = index * len(self.live_cells) + i
+        return index
+
+    def load_pattern_database( self ):
+        """ Loads the pattern database built by patterndb.py: a list of
+        pairs (holes, table), see heuristic5(). The file is an array of
+        unsigned shorts: the number of patterns, then for each pattern its
+        number of holes and their rows and columns, then the tables. In
+        memory, NO_PATTERN_PATH becomes UNREACHABLE, as in the push
+        distances, so that the dead layouts get the same scale of values
+        from every heuristic. """
+        self.pattern_database = []
+        if os.path.exists(self.pattern_database_file()):
+            values = array('H')
+            with open(self.pattern_database_file(), 'rb') as database_file:
+                values.frombytes(database_file.read())
+            patterns = []
+            position = 1
+            for pattern in range(values[0]):
+                number_of_holes = values[position]
+                positions = values[position + 1:position + 1 + 2 * number_of_holes]
+                patterns.append(tuple(self.cell(row, column) for row, column in zip(positions[0::2], positions[1::2])))
+                position += 1 + 2 * number_of_holes
+            for holes in patterns:
+                size = len(self.live_cells) ** len(holes)
+                table = [UNREACHABLE if value == NO_PATTERN_PATH else value for value in values[position:position + size]]
+                self.pattern_database.append((holes, table))
+                position += size
+
+    def save_pattern_database( self, patterns ):
+        """ Writes the patterns, given as pairs (holes, table), in the file of the level. """
+        if not os.path.isdir(os.path.dirname(self.pattern_database_file())):
+            os.makedirs(os.path.dirname(self.pattern_database_file()))
+        values = array('H', [len(patterns)])
+        for holes, table in patterns:
+            values.append(len(holes))
+            for cell in holes:
+                values.extend(self.position(cell))
+        for holes, table in patterns:
+            values.extend(table)
+        with open(self.pattern_database_file(), 'wb') as database_file:
+            database_file.write(values.tobytes())
+
+    def compute_matching_costs( self, number_of_crates ):
+        """ matching_costs[cell] is the row of costs of a crate in the cell
+        for the crate-to-hole matching: its push distance to every hole,
+        followed by zeros for the crates that are not needed in a hole. """
+        padding = [0] * (number_of_crates - len(self.hole_cells))
+        self.matching_costs = [[distances[cell] for distances in self.push_distances] + padding
+                               for cell in range(len(self.walls))]
 
     def mark_dead_cells( self ):
         """ The map dead_map is use to mark cell where the crates cannot be pushed,
@@ -330,20 +504,20 @@ class SokobanState( ):
 
         for y in range(height):
             for x in range(len(self.level[y])):
-                if self.level[y][x] is not Level.wall and y != 0 and x != 0 and y != height - 1 and x != width - 1 and x < len(self.level[y + 1]) and x < len(self.level[y - 1]):
+                if self.level[y][x] != Level.wall and y != 0 and x != 0 and y != height - 1 and x != width - 1 and x < len(self.level[y + 1]) and x < len(self.level[y - 1]):
                     self.dead_map[y][x] = 1
 
         # mark corners
         for y in range(height):
             for x in range(len(self.level[y])):
                 if self.dead_map[y][x] == 1:
-                    if self.level[y][x] is Level.floor and self.level[y - 1][x] is Level.wall and self.level[y][x - 1] is Level.wall:
+                    if self.level[y][x] == Level.floor and self.level[y - 1][x] == Level.wall and self.level[y][x - 1] == Level.wall:
                         self.dead_map[y][x] = DEAD_CELL
-                    if self.level[y][x] is Level.floor and self.level[y + 1][x] is Level.wall and self.level[y][x - 1] is Level.wall:
+                    if self.level[y][x] == Level.floor and self.level[y + 1][x] == Level.wall and self.level[y][x - 1] == Level.wall:
                         self.dead_map[y][x] = DEAD_CELL
-                    if self.level[y][x] is Level.floor and self.level[y - 1][x] is Level.wall and self.level[y][x + 1] is Level.wall:
+                    if self.level[y][x] == Level.floor and self.level[y - 1][x] == Level.wall and self.level[y][x + 1] == Level.wall:
                         self.dead_map[y][x] = DEAD_CELL
-                    if self.level[y][x] is Level.floor and self.level[y + 1][x] is Level.wall and self.level[y][x + 1] is Level.wall:
+                    if self.level[y][x] == Level.floor and self.level[y + 1][x] == Level.wall and self.level[y][x + 1] == Level.wall:
                         self.dead_map[y][x] = DEAD_CELL
 
         def mark_row( start_x, y ):
@@ -352,7 +526,7 @@ class SokobanState( ):
                 if self.dead_map[y][x] == DEAD_CELL:
                     end_x = x
                 elif not (self.dead_map[y][x] == 1
-                          and (self.level[y - 1][x] is Level.wall or self.level[y + 1][x] is Level.wall)
+                          and (self.level[y - 1][x] == Level.wall or self.level[y + 1][x] == Level.wall)
                           and self.level[y][x] == Level.floor):
                     break
             if end_x > -1:
@@ -371,29 +545,125 @@ class SokobanState( ):
                 if self.dead_map[y][x] == DEAD_CELL:
                     end_y = y
                 elif not (self.dead_map[y][x] == 1
-                          and (self.level[y][x - 1] is Level.wall or self.level[y][x + 1] is Level.wall)
+                          and (self.level[y][x - 1] == Level.wall or self.level[y][x + 1] == Level.wall)
                           and self.level[y][x] == Level.floor):
                     break
             if end_y > -1:
                 for y in range(start_y + 1, end_y):
                     self.dead_map[y][x] = DEAD_CELL
 
-        # mark dead row
-        for x in range(len(self.level[y])):
+        # mark dead column
+        for x in range(width):
             for y in range(height):
                 if self.dead_map[y][x] == DEAD_CELL:
                     mark_column(x, y)
 
+class SokobanState( object ):
+    """
+    A search problem defines the state space, start state, goal test,
+    successor function and cost function.  This search problem can be
+    used to find paths to a particular point on the sokoban board.
+
+    The state space consists of the player's cell and the cells of the
+    crates, stored as a bitmask. Everything else (walls, holes, dead cells)
+    is in the board shared by all the states. A state is never modified:
+    a move returns a new state.
+
+    In push mode with a normalizing board, two states are equal when they
+    have the same crates and the player can walk from one position to the
+    other: the player's cell is then replaced by the smallest cell of its
+    region in __eq__ and __hash__.
+
+    Note: this search problem is fully specified; you should NOT change it.
+    """
+    __slots__ = ('board', 'player', 'crates', 'crate_hash', 'region', 'matching')
+
+    def __init__( self, board = None, player = 0, crates = 0, crate_hash = 0 ):
+        self.board = board
+        self.player = player
+        self.crates = crates
+        self.crate_hash = crate_hash # xor of the Zobrist keys of the crates
+        self.region = None # smallest cell of the player's region, computed once
+        self.matching = None # see heuristic4()
+
+    def __eq__( self, other ):
+        return self.crates == other.crates and self.player_key() == other.player_key()
+
+    def __hash__( self ):
+        return self.crate_hash ^ self.board.player_keys[self.player_key()]
+
+    def player_key( self ):
+        """ Returns the cell that identifies the player in the state. """
+        if not (self.board.normalize and self.board.push_moves):
+            return self.player
+        if self.region is None:
+            self.region = min(self.reachable_cells())
+        return self.region
+
+    @property
+    def player_position( self ):
+        return self.board.position(self.player)
+
+    def crate_cells( self ):
+        """ Returns the list of the cells that hold a crate. """
+        cells = []
+        crates = self.crates
+        while crates:
+            bit = crates & -crates
+            cells.append(bit.bit_length() - 1)
+            crates ^= bit
+        return cells
+
+    def load_level( self, level_file ):
+        level = []
+        crates = []
+        for row, line in enumerate(level_file):
+            level_row = list(line.rstrip('\n'))
+            for column, x in enumerate(level_row):
+                if x == Level.player:
+                    level_row[column] = Level.floor
+                    player = (row, column)
+
+                elif x == Level.crate:
+                    level_row[column] = Level.floor
+                    crates.append((row, column))
+
+                elif x == Level.crate_in_hole:
+                    level_row[column] = Level.hole
+                    crates.append((row, column))
+
+            level.append(level_row)
+        width = max(len(line) for line in level)
+        for level_row in level:
+            level_row.extend(Level.floor * (width - len(level_row)))
+        self.board = SokobanBoard(level)
+        self.player = self.board.cell(*player)
+        self.crates = 0
+        self.crate_hash = 0
+        for position in crates:
+            cell = self.board.cell(*position)
+            self.crates |= self.board.bits[cell]
+            self.crate_hash ^= self.board.crate_keys[cell]
+        self.board.compute_matching_costs(len(crates))
+        self.board.find_goal_room(self.player, self.crates)
+
     def is_goal_state( self ) :
         """ Returns the goal state (in your state space,
         not the full Pacman state space).
         """
-        SokobanFrame.number_of_explored_nodes += 1
-        all_holes_filled = True
-        for hole in self.holes.values():
-            if hole is not Hole.filled:
-                all_holes_filled = False
-        return all_holes_filled
+        holes = self.board.holes
+        return self.crates & holes == holes
+
+    def is_solution( self, path ):
+        """ Returns True if playing the directions of the path from this
+        state, with the rules of the game, fills all the holes. """
+        state = self
+        for direction in path:
+            state = state.move_player(direction, False)
+            if state is None:
+                return False
+        holes = self.board.holes
+        return state.crates & holes == holes
 
     def get_successor_states( self ):
         """
@@ -402,112 +672,249 @@ class SokobanState( ):
         successor to the current state, 'action' is the direction
         required to get there, and 'stepCost' is the incremental
         cost of expanding to that successor (always 1).
+
+        When the board is in push mode, the successors are the pushes
+        returned by get_push_successor_states().
         """ 
+        if self.board.push_moves:
+            return self.get_push_successor_states()
         successors = []
-        for action in [Direction.left, Direction.right, Direction.up, Direction.down]:
-            next_state = copy.deepcopy(self);
-            if next_state.move_player(action):
+        for action, offset in self.board.moves:
+            next_state = self.move_player(action)
+            if next_state is not None:
                 cost = 1
                 successors.append( ( next_state, action, cost) )
 
         return successors
 
-    def move_player( self, direction ):
-        row, column = self.player_position
-        prev_row, prev_column = row, column
-
-        blocked = True
-        if direction == Direction.left and self.level[row][column - 1] is not Level.wall and column > 0:
-            blocked = self.move_crate((row, column - 1), (row, column - 2))
-            if not blocked:
-                self.player_position = (row, column - 1)
-        elif direction == Direction.right and self.level[row][column + 1] is not Level.wall:
-            blocked = self.move_crate((row, column + 1), (row, column + 2))
-            if not blocked:
-                self.player_position = (row, column + 1)
-        elif direction == Direction.down and self.level[row + 1][column] is not Level.wall:
-            blocked = self.move_crate((row + 1, column), (row + 2, column))
-            if not blocked:
-                self.player_position = (row + 1, column)
-        elif direction == Direction.up and self.level[row - 1][column] is not Level.wall and row > 0:
-            blocked = self.move_crate((row - 1, column), (row - 2, column))
-            if not blocked:
-                self.player_position = (row - 1, column)
-
-        if self.is_goal_state():
-            return True
-        
-        return not blocked
-
-    def move_crate( self, location, next_location ):
-        row, column = location
-        next_row, next_column = next_location
-
-        if self.is_blocked(location, next_location):
-            return True
-        if self.level[row][column] is Level.crate and self.level[next_row][next_column] is Level.floor:
-            self.level[row][column] = Level.floor
-            self.level[next_row][next_column] = Level.crate
-
-        elif self.level[row][column] is Level.crate and self.level[next_row][next_column] is Level.hole:
-            self.level[row][column] = Level.floor
-            self.level[next_row][next_column] = Level.crate_in_hole
-            self.holes[(next_row, next_column)] = Hole.filled
-
-        elif self.level[row][column] is Level.crate_in_hole and self.level[next_row][next_column] is Level.floor:
-            self.level[row][column] = Level.hole
-            self.level[next_row][next_column] = Level.crate
-            self.holes[(row, column)] = Hole.empty
-
-        elif self.level[row][column] is Level.crate_in_hole and self.level[next_row][next_column] is Level.hole:
-            self.level[row][column] = Level.hole
-            self.level[next_row][next_column] = Level.crate_in_hole
-            self.holes[(row, column)] = Hole.empty
-            self.holes[(next_row, next_column)] = Hole.filled
+    def get_push_successor_states( self ):
+        """
+        Returns the successors reached by walking to a crate and pushing
+        it once. The action is the tuple of the directions of the walk
+        followed by the push, and the cost is the number of moves.
+
+        With the macro moves of the board, a crate pushed along a tunnel is
+        pushed to its end, and a crate pushed in the goal room is brought
+        to its hole at once (see find_tunnels() and find_goal_room()).
+        """
+        board = self.board
+        reachable = self.reachable_cells()
+        if self.region is None:
+            self.region = min(reachable)
+        macro_moves = board.macro_moves
+        room = board.room if macro_moves else 0
+        successors = []
+        for cell in reachable:
+            for action, offset in board.moves:
+                crate_cell = cell + offset
+                if self.crates & board.bits[crate_cell]:
+                    if room & board.bits[crate_cell]:
+                        continue # the crates in the goal room stay on their hole
+                    next_state = self.move_crate(crate_cell, crate_cell + offset)
+                    if next_state is None:
+                        continue
+                    walk = self.walk(reachable, cell) + [action]
+                    if room & board.bits[crate_cell + offset]:
+                        path = board.room_paths.get((crate_cell + offset, bin(self.crates & room).count('1')))
+                        if path is None:
+                            continue
+                        for direction in path:
+                            next_state = next_state.move_player(direction, False)
+                        walk += path
+                    elif macro_moves:
+                        while (crate_cell + offset, offset) in board.tunnels and (crate_cell + 2 * offset, offset) in board.tunnels:
+                            if board.holes & board.bits[crate_cell + offset]:
+                                break
+                            crate_cell += offset
+                            pushed_state = next_state.move_crate(crate_cell, crate_cell + offset)
+                            if pushed_state is None:
+                                break
+                            next_state = pushed_state
+                            walk.append(action)
+                    successors.append( ( next_state, tuple(walk), len(walk)) )
+        return successors
+
+    def get_pull_successor_states( self ):
+        """
+        Returns the states from which one push leads to this state, for the
+        searches that go backward from the goal: the player walks next to a
+        crate and steps away from it, pulling the crate. The action is the
+        pair (cell, direction) of the push that undoes the pull: the player
+        stands in the cell and pushes in the direction.
+        """
+        board = self.board
+        walls, bits, crates = board.walls, board.bits, self.crates
+        successors = []
+        for cell in self.reachable_cells():
+            for action, offset in board.moves:
+                crate_cell = cell - offset
+                next_cell = cell + offset
+                if crates & bits[crate_cell] and not walls[next_cell] and not crates & bits[next_cell]:
+                    next_crates = crates ^ bits[crate_cell] ^ bits[cell]
+                    crate_hash = self.crate_hash ^ board.crate_keys[crate_cell] ^ board.crate_keys[cell]
+                    successors.append( ( SokobanState(board, next_cell, next_crates, crate_hash),
+                                         (next_cell, board.actions[-offset]), 1) )
+        return successors
 
+    def get_goal_states( self ):
+        """ Returns the goal states with the crates of this state: the
+        crates in the holes and the player in each region of the remaining
+        cells. There is none if the numbers of crates and holes differ. """
+        board = self.board
+        if len(self.crate_cells()) != len(board.hole_cells):
+            return []
+        crate_hash = 0
+        for cell in board.hole_cells:
+            crate_hash ^= board.crate_keys[cell]
+        goal_states = []
+        explored = set(board.hole_cells)
+        for cell in range(len(board.walls)):
+            if not board.walls[cell] and cell not in explored:
+                state = SokobanState(board, cell, board.holes, crate_hash)
+                explored.update(state.reachable_cells())
+                goal_states.append(state)
+        return goal_states
+
+    def reachable_cells( self ):
+        """ Returns the cells the player can walk to without pushing a crate,
+        as a dict mapping each cell to the pair (previous cell, direction)
+        of a shortest walk. The player's cell is mapped to None. """
+        board = self.board
+        walls, bits, crates = board.walls, board.bits, self.crates
+        reachable = {self.player: None}
+        queue = [self.player]
+        for cell in queue:
+            for action, offset in board.moves:
+                next_cell = cell + offset
+                if not walls[next_cell] and not crates & bits[next_cell] and next_cell not in reachable:
+                    reachable[next_cell] = (cell, action)
+                    queue.append(next_cell)
+        return reachable
+
+    def walk( self, reachable, cell ):
+        """ Returns the directions from the player to the cell, using the
+        result of reachable_cells(). """
+        directions = []
+        while reachable[cell] is not None:
+            cell, action = reachable[cell]
+            directions.append(action)
+        directions.reverse()
+        return directions
+
+    def move_player( self, direction, prune = True ):
+        """ Returns the state reached by moving the player in the
+        direction, or None if the move is blocked. When prune is True,
+        a crate cannot be pushed in a dead cell. """
+        board = self.board
+        offset = board.offsets[direction]
+        cell = self.player + offset
+        if board.walls[cell]:
+            return None
+        if self.crates & board.bits[cell]:
+            return self.move_crate(cell, cell + offset, prune)
+        next_state = SokobanState(board, cell, self.crates, self.crate_hash)
+        next_state.matching = self.matching # same crates, same matching
+        return next_state
+
+    def move_crate( self, cell, next_cell, prune = True ):
+        """ Returns the state reached when the player pushes the crate in
+        cell to next_cell, or None if the push is blocked. """
+        board = self.board
+        if board.walls[next_cell] or self.crates & board.bits[next_cell]:
+            return None
+        if prune and not board.live[next_cell]:
+            return None
+        crates = self.crates ^ board.bits[cell] ^ board.bits[next_cell]
+        crate_hash = self.crate_hash ^ board.crate_keys[cell] ^ board.crate_keys[next_cell]
+        next_state = SokobanState(board, cell, crates, crate_hash)
+        if prune and next_state.is_deadlock(next_cell):
+            return None
+        if self.matching is not None and len(self.matching) == 2:
+            # heuristic4() will repair the matching of the parent
+            next_state.matching = (self.matching, cell, next_cell)
+        return next_state
+
+    def is_deadlock( self, cell ):
+        """ Returns True if the crate that was just pushed in the cell
+        makes the state unsolvable:
+        - it closes a 2x2 square of walls and crates that holds a crate
+          out of a hole, or
+        - it is frozen, i.e. it can be pushed along neither axis, together
+          with the crates that block it, and one of them is out of a hole, or
+        - it completes one of the deadlock patterns of the level.
+        """
+        board = self.board
+        walls, bits, crates = board.walls, board.bits, self.crates
+        width = board.width
+        for corner in (cell, cell - 1, cell - width, cell - width - 1):
+            square = (corner, corner + 1, corner + width, corner + width + 1)
+            if all(walls[x] or crates & bits[x] for x in square):
+                if any(crates & bits[x] and not board.holes & bits[x] for x in square):
+                    return True
+
+        frozen = []
+        if self.is_frozen(cell, set(), frozen):
+            for x in frozen:
+                if not board.holes & bits[x]:
+                    return True
+
+        for pattern in board.deadlock_patterns.get(cell, ()):
+            if crates & pattern == pattern:
+                return True
         return False
 
-    def is_blocked( self, location, next_location ):
-        row, column = location
-        next_row, next_column = next_location
-        if ((self.level[row][column] is Level.crate or self.level[row][column] is Level.crate)
-            and self.dead_map[next_row][next_column] != 1):
-            return True
-        if self.level[row][column] is Level.crate and self.level[next_row][next_column] is Level.wall:
-            return True
-        elif self.level[row][column] is Level.crate_in_hole and self.level[next_row][next_column] is Level.wall:
-            return True
-        elif (self.level[row][column] is Level.crate_in_hole
-              and (self.level[next_row][next_column] is Level.crate
-                   or self.level[next_row][next_column] is Level.crate_in_hole)):
-            return True
-        elif (self.level[row][column] is Level.crate
-              and (self.level[next_row][next_column] is Level.crate
-                   or self.level[next_row][next_column] is Level.crate_in_hole)):
-            return True
+    def is_frozen( self, cell, visited, frozen ):
+        """ Returns True if the crate in the cell can be pushed along
+        neither axis. The crates in visited are considered as walls to stop
+        the recursion, and the crates found frozen are added to frozen. """
+        board = self.board
+        visited.add(cell)
+        for offset in (1, board.width):
+            before, after = cell - offset, cell + offset
+            if board.walls[before] or board.walls[after]:
+                continue
+            if not board.live[before] and not board.live[after]:
+                continue
+            if before in visited or after in visited:
+                continue
+            if self.crates & board.bits[before] and self.is_frozen(before, visited, frozen):
+                continue
+            if self.crates & board.bits[after] and self.is_frozen(after, visited, frozen):
+                continue
+            return False
+        frozen.append(cell)
+        return True
 
     def heuristic( self ):
-        return self.heuristic2()
+        """ heuristic5() if the level has a pattern database, heuristic4()
+        otherwise, which only depend on the crates. The value or the matching
+        of each crate layout is kept in HEURISTIC_CACHE, shared by all the
+        searches of the process, with the level key. """
+        if self.board.pattern_database:
+            key = (self.board.key, self.crates, 'patterns')
+            value = HEURISTIC_CACHE.get(key)
+            if value is None:
+                value = self.heuristic5()
+                HEURISTIC_CACHE.put(key, value)
+            return value
+        key = (self.board.key, self.crates)
+        matching = HEURISTIC_CACHE.get(key)
+        if matching is None:
+            value = self.heuristic4()
+            HEURISTIC_CACHE.put(key, self.matching)
+            return value
+        self.matching = matching
+        return matching[1].cost()
 
     def heuristic1( self ):
         """ Number of misplaced crates. """
-        number_of_misplaced_crate = 0
-        for y in range(len(self.level)):
-            for x in range(len(self.level[y])):
-                if self.level[y][x] is Level.crate:
-                    number_of_misplaced_crate += 1 
-        return number_of_misplaced_crate
+        return bin(self.crates & ~self.board.holes).count('1')
 
     def heuristic2( self ):
         """ Manhattan distance of crates to nearest hole. """
-        crates = []
-        holes = []
-        for y in range(len(self.level)):
-            for x in range(len(self.level[y])):
-                if self.level[y][x] is Level.crate:
-                    crates += [(x, y)]
-                elif self.level[y][x] is Level.hole:
-                    holes += [(x, y)]
+        board = self.board
+        crates = [board.position(cell) for cell in self.crate_cells()]
+        holes = [board.position(cell) for cell in board.hole_cells]
 
         def manhattanDistance( c1, c2 ):
             return abs(c1[0] - c2[0]) + abs(c1[1] - c2[1])
@@ -523,4 +930,70 @@ class SokobanState( ):
 
         distance = 0
         return total_distance + distance
-    
+
+    def heuristic3( self ):
+        """ Number of pushes needed to bring each crate to its nearest hole,
+        read from the tables computed with the board. """
+        nearest_hole = self.board.nearest_hole
+        return sum(nearest_hole[cell] for cell in self.crate_cells())
+
+    def heuristic4( self ):
+        """ Cost of the minimum-cost matching of the crates to the holes,
+        where each hole receives its own crate, over push distances.
+
+        The matching is kept in the state as the pair (crate cells,
+        assignment). A state pushed from a state whose matching is known
+        gets the triple (parent matching, crate cell, new crate cell), and
+        only the row of the moved crate is repaired here. """
+        matching = self.matching
+        costs = self.board.matching_costs
+        if matching is None:
+            cells = self.crate_cells()
+            matching = (cells, Assignment([costs[cell] for cell in cells]))
+        elif len(matching) == 3:
+            (cells, assignment), cell, next_cell = matching
+            cells = list(cells)
+            row = cells.index(cell)
+            cells[row] = next_cell
+            assignment = assignment.copy()
+            assignment.update_row(row, costs[next_cell])
+            matching = (cells, assignment)
+        self.matching = matching
+        return matching[1].cost()
+
+    def heuristic5( self ):
+        """ Sum of the pattern database values, over the best split of the
+        crates between the patterns of holes.
+
+        Each pattern is a set of one or two holes, and its table gives the
+        exact number of pushes needed to fill them when there is no other
+        crate. The patterns do not share holes and no crate is counted in
+        two of them, so the sum is a lower bound. It is minimized over the
+        ways to give the crates to the patterns, pattern after pattern:
+        best[crates] is the smallest sum for the patterns done so far with
+        the given crates (a bitmask of positions in the list of crates). """
+        board = self.board
+        live_index = board.live_index
+        cells = self.crate_cells()
+        if not all(board.live[cell] for cell in cells):
+            return UNREACHABLE
+        indices = [live_index[cell] for cell in cells]
+        rows = [index * len(board.live_cells) for index in indices]
+        best = {0: 0}
+        for holes, table in board.pattern_database:
+            next_best = {}
+            for used, value in best.items():
+                free = [i for i in range(len(indices)) if not used >> i & 1]
+                if len(holes) == 1:
+                    costs = [(1 << i, table[indices[i]]) for i in free]
+                else:
+                    costs = [(1 << i | 1 << j, table[rows[i] + indices[j]]) for i, j in itertools.combinations(free, 2)]
+                for crates, cost in costs:
+                    mask = used | crates
+                    cost += value
+                    if cost < next_best.get(mask, float("inf")):
+                        next_best[mask] = cost
+            best = next_best
+        if not best:
+            return UNREACHABLE # fewer crates than holes
+        return min(best.values())
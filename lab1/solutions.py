@@ -0,0 +1,98 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file solutions.py
+#
+# @author Régis Clouard
+
+import hashlib
+import os
+import sqlite3
+
+_ROOT = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_FILE = os.path.join(_ROOT, 'solutions.db')
+
+def level_key( gridfile ):
+    """ Returns the sha1 of the level file, without the trailing spaces of
+    the lines and the empty lines around the level, so that reformatting
+    the file does not change it. """
+    with open(gridfile, "r") as level_file:
+        lines = [line.rstrip() for line in level_file]
+    while lines and not lines[-1]:
+        lines.pop()
+    while lines and not lines[0]:
+        lines.pop(0)
+    return hashlib.sha1('\n'.join(lines).encode('utf-8')).hexdigest()
+
+def search_mode( pushes, normalize, board ):
+    """ Returns the name of the state space searched, followed by the
+    settings of the board that change the solutions found: the macro
+    moves in push mode and the heuristic, with the hash of the pattern
+    database file when there is one. """
+    if normalize:
+        mode = 'normalize'
+    elif pushes:
+        mode = 'pushes'
+    else:
+        mode = 'steps'
+    if (pushes or normalize) and board.macro_moves:
+        mode += '+macros'
+    if board.pattern_database:
+        with open(board.pattern_database_file(), 'rb') as database_file:
+            return mode + '/heuristic5:' + hashlib.sha1(database_file.read()).hexdigest()
+    return mode + '/heuristic4'
+
+class SolutionCache:
+    """
+    Stores the solutions found by the agents in an SQLite database, keyed
+    by the level (see level_key()), the agent name and the search mode
+    (see search_mode()).
+    A solution is a list of directions. lookup() replays the solution
+    before returning it and removes it from the cache if it is invalid.
+    """
+    def __init__( self, filename = DEFAULT_FILE ):
+        # several batch workers may write at the same time
+        self.connection = sqlite3.connect(filename, timeout = 60)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS solutions ("
+                                "level TEXT, agent TEXT, mode TEXT, path TEXT, "
+                                "PRIMARY KEY (level, agent, mode))")
+        self.connection.commit()
+
+    def get( self, level, agent, mode ):
+        """ Returns the stored solution, or None."""
+        row = self.connection.execute("SELECT path FROM solutions WHERE level = ? AND agent = ? AND mode = ?",
+                                      (level, agent, mode)).fetchone()
+        if row is None:
+            return None
+        return row[0].split()
+
+    def put( self, level, agent, mode, path ):
+        """ Stores the solution, replacing the previous one if any."""
+        self.connection.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?)",
+                                (level, agent, mode, ' '.join(path)))
+        self.connection.commit()
+
+    def delete( self, level, agent, mode ):
+        self.connection.execute("DELETE FROM solutions WHERE level = ? AND agent = ? AND mode = ?",
+                                (level, agent, mode))
+        self.connection.commit()
+
+    def lookup( self, level, agent, mode, state ):
+        """ Returns the stored solution if it solves the level from the
+        state, or None. An invalid solution is removed."""
+        path = self.get(level, agent, mode)
+        if path is None:
+            return None
+        if not state.is_solution(path):
+            self.delete(level, agent, mode)
+            return None
+        return path
+
+    def close( self ):
+        self.connection.close()
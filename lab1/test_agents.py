@@ -0,0 +1,42 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file test_agents.py
+#
+# @author Régis Clouard
+
+import os
+import unittest
+from agents import ARASS, UCS
+from sokobanframe import SokobanState
+
+_ROOT = os.path.abspath(os.path.dirname(__file__))
+
+def load_state( name, pushes ):
+    state = SokobanState()
+    with open(os.path.join(_ROOT, 'puzzles', name), "r") as level_file:
+        state.load_level(level_file)
+    state.board.push_moves = pushes
+    return state
+
+class ARASSTest( unittest.TestCase ):
+
+    def test_solution_within_bound( self ):
+        """ The solution of ARASS is at most the reported suboptimality
+        bound times longer than the optimal one, found by UCS. """
+        for name in ['puzzle1.txt', 'puzzle2.txt', 'puzzle4.txt', 'puzzle6.txt']:
+            for pushes in [False, True]:
+                optimal = len(UCS().solve(load_state(name, pushes)))
+                agent = ARASS()
+                path = agent.solve(load_state(name, pushes))
+                self.assertTrue(load_state(name, False).is_solution(path))
+                self.assertLessEqual(len(path), agent.statistics.suboptimality * optimal + 1e-9, (name, pushes))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8; mode: python -*-
+
+# ENSICAEN
+# École Nationale Supérieure d'Ingénieurs de Caen
+# 6 Boulevard Maréchal Juin
+# F-14050 Caen Cedex France
+#
+# Artificial Intelligence 2I1AE1
+
+# @file test_sokobanframe.py
+#
+# @author Régis Clouard
+
+import io
+import unittest
+from collections import deque
+from sokobanframe import SokobanState, UNREACHABLE
+from patterndb import pattern_holes, build_table
+
+# the first hole filled must not be the entry of the goal room
+ROOM_ENTRY_LEVEL = """*********
+* * *o  *
+*P #  o *
+*  #*   *
+*   *   *
+*********
+"""
+
+# one crate for two holes
+MISSING_CRATE_LEVEL = """*******
+*     *
+*P#o o*
+*******
+"""
+
+def load_state( level ):
+    state = SokobanState()
+    state.load_level(io.StringIO(level))
+    return state
+
+def can_be_solved( state ):
+    """ Breadth-first search over the pushes of the state. """
+    closed_list = set([state])
+    open_list = deque([state])
+    while open_list:
+        current_state = open_list.popleft()
+        if current_state.is_goal_state():
+            return True
+        for next_state, action, cost in current_state.get_push_successor_states():
+            if next_state not in closed_list:
+                closed_list.add(next_state)
+                open_list.append(next_state)
+    return False
+
+class MacroMovesTest( unittest.TestCase ):
+
+    def test_goal_room_keeps_level_solvable( self ):
+        for macro_moves in [False, True]:
+            state = load_state(ROOM_ENTRY_LEVEL)
+            state.board.push_moves = True
+            state.board.normalize = True
+            state.board.macro_moves = macro_moves
+            self.assertTrue(state.board.room) # the room is found
+            self.assertTrue(can_be_solved(state), macro_moves)
+
+class PatternDatabaseTest( unittest.TestCase ):
+
+    def test_fewer_crates_than_holes( self ):
+        state = load_state(MISSING_CRATE_LEVEL)
+        board = state.board
+        board.push_moves = True
+        board.normalize = True
+        board.pattern_database = [(holes, build_table(board, holes)) for holes in pattern_holes(board)]
+        self.assertEqual(state.heuristic5(), UNREACHABLE)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,6 +14,8 @@
 import sys
 import inspect
 import heapq
+import time
+from collections import OrderedDict
 
 class PriorityQueue:
     """
@@ -43,6 +45,269 @@ class PriorityQueue:
         """ Returns true if the queue is empty."""
         return len(self.heap) == 0
 
+    def items( self ):
+        """ Returns the items in the queue, in no particular order."""
+        return [item for priority, id_number, item in self.heap]
+
+    def __len__( self ):
+        return len(self.heap)
+
+class BucketQueue:
+    """
+      A priority queue for the small integer priorities of the searches
+      (path costs, heuristic values), with the same methods as
+      PriorityQueue. The items of same priority and same tie are kept in
+      a bucket; pop() returns an item of the lowest priority, then of the
+      lowest tie, and the last one pushed among them. The order is thus
+      deterministic, and choosing the tie (e.g. h for A*) favours the
+      nodes closest to a goal.
+
+      The keys of the non-empty buckets are kept in a heap, but there are
+      only a few distinct priorities in a search, so push() and pop() take
+      constant time in practice.
+    """
+    def  __init__( self ):
+        self.buckets = {} # (priority, tie) -> list of items
+        self.keys = [] # heap of the keys of the non-empty buckets
+        self.size = 0
+
+    def push( self, item, priority, tie = 0 ):
+        """ Adds the item in the queue with the specified priority."""
+        key = (priority, tie)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = []
+            heapq.heappush(self.keys, key)
+        bucket.append(item)
+        self.size += 1
+
+    def pop( self ):
+        """ Returns the item with the lower priority."""
+        key = self.keys[0]
+        bucket = self.buckets[key]
+        item = bucket.pop()
+        if not bucket:
+            heapq.heappop(self.keys)
+            del self.buckets[key]
+        self.size -= 1
+        return (item, key[0])
+
+    def isEmpty( self ):
+        """ Returns true if the queue is empty."""
+        return self.size == 0
+
+    def items( self ):
+        """ Returns the items in the queue, in no particular order."""
+        return [item for bucket in self.buckets.values() for item in bucket]
+
+    def __len__( self ):
+        return self.size
+
+class LRUCache:
+    """
+      A dictionary of at most capacity entries: when it is full, adding an
+      entry removes the least recently used one. The numbers of keys found
+      (hits) and not found (misses) by get() are counted.
+    """
+    def  __init__( self, capacity ):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get( self, key ):
+        """ Returns the value of the key, or None."""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put( self, key, value ):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last = False)
+
+    def __len__( self ):
+        return len(self.entries)
+
+# The heuristic values of the crate layouts, shared by all the searches of
+# the process (see SokobanState.heuristic()).
+HEURISTIC_CACHE = LRUCache(100000)
+
+class SearchStatistics:
+    """
+      The statistics of one search: the numbers of nodes expanded, generated
+      and generated again (duplicates), the largest sizes of the frontier and
+      of the set of explored states, the number of heuristic evaluations,
+      the numbers of heuristic values found in and missing from
+      HEURISTIC_CACHE, the wall-clock and CPU times, and, for the anytime
+      searches, the bound on the ratio between the cost of the solution
+      and the optimal one (0 when the search does not give one).
+    """
+    FIELDS = ['expanded', 'generated', 'duplicates', 'max_frontier', 'max_closed',
+              'heuristic_calls', 'cache_hits', 'cache_misses', 'wall_time', 'cpu_time',
+              'suboptimality']
+
+    def  __init__( self ):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+        self.start_times = None
+
+    def start( self ):
+        self.start_times = (time.time(), time.process_time(), HEURISTIC_CACHE.hits, HEURISTIC_CACHE.misses)
+
+    def stop( self ):
+        if self.start_times:
+            wall_time, cpu_time, hits, misses = self.start_times
+            self.wall_time += time.time() - wall_time
+            self.cpu_time += time.process_time() - cpu_time
+            self.cache_hits += HEURISTIC_CACHE.hits - hits
+            self.cache_misses += HEURISTIC_CACHE.misses - misses
+            self.start_times = None
+
+    def update( self, frontier_size, closed_size = 0 ):
+        """ Records the current sizes of the frontier and of the closed set."""
+        if frontier_size > self.max_frontier:
+            self.max_frontier = frontier_size
+        if closed_size > self.max_closed:
+            self.max_closed = closed_size
+
+    def as_dict( self ):
+        return dict((field, getattr(self, field)) for field in self.FIELDS)
+
+class NodeStore:
+    """
+      Stores the nodes of a search tree. A node is just an index in the
+      store, which records its state, the index of its parent node, the
+      action that leads to it from its parent and the cost of the path from
+      the root. A frontier then only holds node indexes, and the path is
+      rebuilt from the parent links once, when a goal is reached.
+    """
+    def  __init__( self ):
+        self.states = []
+        self.parents = []
+        self.actions = []
+        self.costs = []
+
+    def add( self, state, parent = None, action = None, cost = 0 ):
+        """ Adds a node and returns its index."""
+        self.states.append(state)
+        self.parents.append(parent)
+        self.actions.append(action)
+        self.costs.append(cost)
+        return len(self.states) - 1
+
+    def path( self, node ):
+        """ Returns the list of actions from the root to the node."""
+        path = []
+        while self.parents[node] is not None:
+            path.append(self.actions[node])
+            node = self.parents[node]
+        path.reverse()
+        return expand_actions(path)
+
+    def __len__( self ):
+        return len(self.states)
+
+class Assignment:
+    """
+      Minimum-cost assignment of n rows to n columns, solved with the
+      Hungarian algorithm. The row and column potentials are kept, so that
+      when the costs of a single row change the assignment is repaired by
+      one augmenting path in O(n^2) instead of being solved again in O(n^3).
+    """
+    def  __init__( self, costs = None ):
+        self.costs = [] # the rows of costs, never modified in place
+        self.u = [0] # row potentials, 1-indexed
+        self.v = [0] # column potentials, 1-indexed
+        self.p = [0] # p[j] is the row assigned to column j, 0 if none
+        if costs:
+            n = len(costs)
+            self.costs = list(costs)
+            self.u = [0] * (n + 1)
+            self.v = [0] * (n + 1)
+            self.p = [0] * (n + 1)
+            for i in range(1, n + 1):
+                self.augment(i)
+
+    def copy( self ):
+        """ Returns a copy that can be updated independently."""
+        assignment = Assignment()
+        assignment.costs = list(self.costs)
+        assignment.u = list(self.u)
+        assignment.v = list(self.v)
+        assignment.p = list(self.p)
+        return assignment
+
+    def augment( self, i ):
+        """ Assigns the free row i (1-indexed) along a shortest augmenting path."""
+        n = len(self.costs)
+        u, v, p = self.u, self.v, self.p
+        minv = [float('inf')] * (n + 1)
+        used = [False] * (n + 1)
+        way = [0] * (n + 1)
+        p[0] = i
+        j0 = 0
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            row = self.costs[i0 - 1]
+            delta = float('inf')
+            j1 = 0
+            for j in range(1, n + 1):
+                if not used[j]:
+                    reduced = row[j - 1] - u[i0] - v[j]
+                    if reduced < minv[j]:
+                        minv[j] = reduced
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(n + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    def update_row( self, i, costs ):
+        """ Replaces the costs of row i (0-indexed) and repairs the assignment."""
+        n = len(self.costs)
+        self.costs[i] = costs
+        row = i + 1
+        for j in range(1, n + 1):
+            if self.p[j] == row:
+                self.p[j] = 0
+        # keep the potentials feasible for the new costs
+        self.u[row] = min(costs[j - 1] - self.v[j] for j in range(1, n + 1))
+        self.augment(row)
+
+    def cost( self ):
+        """ Returns the cost of the assignment."""
+        return sum(self.costs[self.p[j] - 1][j - 1] for j in range(1, len(self.p)) if self.p[j])
+
+def expand_actions( actions ):
+    """ Returns the list of actions where the macro actions, given as
+    tuples of actions, are replaced by the actions they are made of. """
+    path = []
+    for action in actions:
+        if isinstance(action, tuple):
+            path.extend(action)
+        else:
+            path.append(action)
+    return path
+
 ## code to handle timeouts
 import signal
 class TimeoutFunctionException(Exception):